@@ -0,0 +1,932 @@
+"""Pseudo-terminal stand-in for the DUT, for hardware-free runs and benchmarking.
+
+Every emulated board gets a pty and an outlet on an emulated RPS. With --config the
+emulator writes a config for NewSystemPowerCyclecode.py that points its DUTs at them
+(and scales its fixed waits by the same --speed), so a whole run goes end to end
+against canned but configurable console output:
+
+    python DutEmulator.py --duts 2 --speed 20 --config emulator.json --fault link_down=0.1
+    python NewSystemPowerCyclecode.py emulator.json
+"""
+import argparse
+import fnmatch
+import json
+import math
+import os
+import random
+import re
+import select
+import shlex
+import threading
+import time
+import tty
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INTERFACES = ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"]
+
+# Fault name -> what it does when it fires (probability per boot, per item where it applies)
+FAULTS = {
+    "boot_hang": "the board never reaches the login prompt",
+    "login_fail": "the first login attempt is rejected",
+    "nic_late": "an interface's driver is not ready for the first 'ip link set up'",
+    "link_down": "an interface never gets carrier",
+    "modem_missing": "an LTE module does not enumerate",
+    "modem_connect_fail": "--simple-connect fails",
+    "sim_missing": "a modem reports no SIM in the active slot",
+    "usb_missing": "the USB stick does not enumerate",
+    "gps_missing": "the u-blox receiver does not enumerate",
+    "serial_drop": "the USB-serial adapter re-enumerates on power off (needs --link)",
+    "iperf_refused": "an iperf3 peer refuses the throughput test",
+    "thermal_throttle": "the cores throttle while the package is above its passive trip point",
+}
+
+# sensors -j limit suffix -> name in the text output of sensors
+SENSOR_LIMITS = {"min": "low", "max": "high", "crit": "crit"}
+
+# Thermal zone -> (type, offset from the core temperature, trip points as (type, °C))
+PASSIVE_TRIP = 75.0
+THERMAL_ZONES = {"thermal_zone0": ("acpitz", -17.0, [("critical", 105.0)]),
+                 "thermal_zone1": ("x86_pkg_temp", 1.0, [("passive", PASSIVE_TRIP), ("critical", 100.0)])}
+CPU_MAX_FREQ = 3000000  # kHz, as cpufreq reports it: the single-core turbo maximum
+CPU_BASE_FREQ = 2000000  # kHz; all-core load runs between this and CPU_MAX_FREQ
+
+MOTD = """Welcome to Ubuntu 22.04.4 LTS (GNU/Linux 5.15.0-105-generic x86_64)
+
+  System information as of {date}
+
+  System load:  {load:.2f}               Processes:             163
+  Usage of /:   23.4% of 28.89GB   Users logged in:       0
+  Memory usage: {memory}%                 IPv4 address for eno1: 192.168.1.11
+  Swap usage:   0%                 Temperature:           {temperature:.1f} C
+
+Last login: {date} on ttyS0"""
+
+
+class EmulatedDut:
+    """One emulated board: power state, console state machine and a tiny shell."""
+
+    def __init__(self, name, outlet, link, args, outputs):
+        self.name = name
+        self.outlet = outlet
+        self.link = link
+        self.args = args
+        self.outputs = outputs
+        self.rng = random.Random(None if args.seed is None else f"{args.seed}-{name}")
+        self.lock = threading.RLock()
+        self.wake_r, self.wake_w = os.pipe()
+        self.master = self.slave = None
+        self.open_pty()
+
+        self.powered = True
+        self.boot_at = time.monotonic()
+        self.state = "booting"
+        self.line = bytearray()
+        self.faults = set()
+        self.reset_board()
+
+    # --- plumbing
+
+    def scaled(self, seconds):
+        """Emulated duration in wall-clock seconds."""
+        return seconds / self.args.speed
+
+    def open_pty(self):
+        """Creates the console pty (again, when emulating re-enumeration) and updates the link."""
+        if self.master is not None:
+            os.close(self.master)
+            os.close(self.slave)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # a cooked slave would echo the console output back in as input
+        os.set_blocking(self.master, False)
+        self.device = os.ttyname(self.slave)
+        if self.link:
+            if os.path.lexists(self.link):
+                os.remove(self.link)
+            os.symlink(self.device, self.link)
+
+    def write(self, text):
+        """Writes console output; like a UART nobody reads, it is dropped when the buffer is full."""
+        data = text.replace("\r\n", "\n").replace("\n", "\r\n").encode()
+        try:
+            os.write(self.master, data)
+        except (BlockingIOError, OSError):
+            pass
+
+    def fault(self, name):
+        """Rolls the dice for a fault using its configured probability."""
+        return self.rng.random() < self.args.faults.get(name, 0.0)
+
+    # --- power and boot
+
+    def reset_board(self):
+        """Board state after a fresh boot."""
+        self.user = None
+        self.root = False
+        self.pending_sudo = False
+        self.last_status = 0
+        self.links = {}  # iface -> time carrier comes up, None if the link stays down
+        self.addresses = {}  # ip -> iface
+        self.prefixlens = {}  # ip -> prefix length
+        self.late_nics = {iface for iface in INTERFACES if self.fault("nic_late")}
+        self.jobs = 0
+        self.files = {}  # /tmp does not survive a reboot
+        self.stress_until = 0.0
+        self.stress_since = 0.0
+        self.modems_up = [not self.fault("modem_missing") for _ in range(self.args.modems)]
+        self.sims_missing = [self.fault("sim_missing") for _ in range(self.args.modems)]
+        self.modems_connected = set()
+        self.usb_present = not self.fault("usb_missing")
+        self.gps_present = not self.fault("gps_missing")
+        self.throttles = self.fault("thermal_throttle")
+        self.login_failures = 1 if self.fault("login_fail") else 0
+
+    def set_power(self, on):
+        with self.lock:
+            if on and not self.powered:
+                self.boot_at = time.monotonic() + self.scaled(self.args.boot_delay)
+                self.state = "booting"
+                self.write("\n[    0.000000] Linux version 5.15.0-105-generic (buildd@lcy02-amd64-007)\n")
+            elif not on and self.powered:
+                self.state = "off"
+                if self.fault("serial_drop"):
+                    self.open_pty()
+            self.powered = on
+        os.write(self.wake_w, b"x")
+
+    def finish_boot(self):
+        self.reset_board()
+        if self.fault("boot_hang"):
+            self.state = "hung"
+            self.write("[   12.345678] watchdog: BUG: soft lockup - CPU#0 stuck for 22s!\n")
+            return
+        self.write("[  OK  ] Reached target Multi-User System.\n"
+                   "[  OK  ] Started Serial Getty on ttyS0.\n\n"
+                   "Ubuntu 22.04.4 LTS ubuntu ttyS0\n\n")
+        self.state = "login"
+        self.write("ubuntu login: ")
+
+    # --- console input
+
+    def serve(self):
+        while True:
+            with self.lock:
+                wait = self.boot_at - time.monotonic() if self.state == "booting" and self.powered else None
+            if wait is not None and wait <= 0:
+                with self.lock:
+                    self.finish_boot()
+                continue
+            readable, _, _ = select.select([self.master, self.wake_r], [], [], wait)
+            if self.wake_r in readable:
+                os.read(self.wake_r, 64)
+            if self.master in readable:
+                try:
+                    data = os.read(self.master, 4096)
+                except (BlockingIOError, OSError):
+                    continue
+                with self.lock:
+                    self.feed(data)
+
+    def feed(self, data):
+        if self.state not in ("login", "password", "shell", "sudo"):
+            return  # off, booting or hung: nobody is listening
+        for byte in data:
+            char = bytes([byte])
+            if char in (b"\r", b"\n"):
+                if self.state not in ("password", "sudo"):
+                    self.write("\n")
+                line = self.line.decode(errors="ignore")
+                self.line.clear()
+                self.handle_line(line)
+            elif char in (b"\x7f", b"\x08"):
+                del self.line[-1:]
+            else:
+                self.line += char
+                if self.state not in ("password", "sudo"):
+                    self.write(char.decode(errors="ignore"))
+
+    def prompt(self):
+        self.write("root@ubuntu:~# " if self.root else "ubuntu@ubuntu:~$ ")
+
+    def handle_line(self, line):
+        if self.state == "login":
+            if line.strip():
+                self.user = line.strip()
+                self.state = "password"
+                self.write("Password: ")
+            else:
+                self.write("ubuntu login: ")
+        elif self.state == "password":
+            self.write("\n")
+            time.sleep(self.scaled(1.0))
+            if line != self.args.password or self.login_failures:
+                self.login_failures = max(self.login_failures - 1, 0)
+                self.state = "login"
+                self.write("\nLogin incorrect\nubuntu login: ")
+                return
+            self.state = "shell"
+            self.root = self.user == "root"
+            self.write(MOTD.format(date=time.strftime("%a %b %d %H:%M:%S UTC %Y", time.gmtime()),
+                                   load=0.08, memory=9, temperature=self.temperature()) + "\n")
+            self.prompt()
+        elif self.state == "sudo":
+            self.write("\n")
+            self.state = "shell"
+            if line == self.args.password:
+                self.root = True
+            else:
+                self.write("Sorry, try again.\n")
+            self.prompt()
+        else:
+            if self.args.latency:
+                time.sleep(self.args.latency)
+            self.run_line(line)
+            if self.state == "shell":
+                self.prompt()
+
+    # --- shell
+
+    def run_line(self, line):
+        """Runs a command line: ';', '&&', '||', '&' and '|' separated simple commands."""
+        line = line.replace("$(nproc)", str(self.args.cpus))
+        try:
+            lexer = shlex.shlex(line, posix=True, punctuation_chars=";&|>")
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError as e:
+            self.write(f"-bash: {e}\n")
+            self.last_status = 2
+            return
+        command, pipeline, skip = [], [], False
+        for token in tokens + [";"]:
+            if token in (";", "&", "&&", "||", "|"):
+                pipeline.append(command)
+                command = []
+                if token == "|":
+                    continue
+                if not skip:
+                    self.run_pipeline(pipeline, background=token == "&")
+                skip = (token == "&&" and self.last_status != 0) or (token == "||" and self.last_status == 0)
+                pipeline = []
+            else:
+                command.append(str(self.last_status) if token == "$?" else token)
+
+    def run_pipeline(self, pipeline, background=False):
+        pipeline = [command for command in pipeline if command]
+        if not pipeline:
+            return
+        if not background:
+            self.last_status = self.execute(pipeline, background)
+            return
+        self.jobs += 1
+        self.write(f"[{self.jobs}] {4000 + self.rng.randrange(1000)}\n")
+        threading.Thread(target=self.execute, args=(pipeline, background), daemon=True).start()
+        self.last_status = 0
+
+    def execute(self, pipeline, background):
+        """Runs a pipeline, writing its output to the console or a redirect file; returns the exit status."""
+        stdin, status = "", 0
+        for position, argv in enumerate(pipeline):
+            argv, redirect = self.redirection(self.expand(argv))
+            if redirect is not None:
+                self.files[redirect] = ""  # truncated before the command runs, like the shell does
+            output, status = self.run_command(argv, stdin, background)
+            if output and not output.endswith("\n"):
+                output += "\n"
+            if position < len(pipeline) - 1:
+                stdin = output
+            elif redirect is not None:
+                self.files[redirect] = output
+            elif output:
+                self.write(output)
+        return status
+
+    def expand(self, argv):
+        """Expands '*' arguments against the emulated sysfs files like the shell; a pattern without matches stays."""
+        expanded = []
+        for arg in argv:
+            matches = sorted(path for path in self.sysfs_paths() if fnmatch.fnmatchcase(path, arg)) if "*" in arg else []
+            expanded += matches or [arg]
+        return expanded
+
+    @staticmethod
+    def redirection(argv):
+        """Splits '> FILE' (and a trailing '2>&1') off a command; returns (argv, FILE or None)."""
+        if ">" not in argv:
+            return argv, None
+        at = argv.index(">")
+        target, argv = argv[at + 1] if at + 1 < len(argv) else None, argv[:at] + argv[at + 2:]
+        if argv[-3:] == ["2", ">&", "1"]:
+            argv = argv[:-3]
+        return argv, target
+
+    def run_command(self, argv, stdin, background):
+        """Returns (output, exit status) of one simple command."""
+        name, args = argv[0], argv[1:]
+        if name == "sudo":
+            if args[:1] == ["-S"]:
+                args = args[1:]
+            elif not self.root:
+                if args == ["su"] or args == ["-i"]:
+                    self.write("[sudo] password for ubuntu: ")
+                    self.state = "sudo"
+                    return "", 0
+            if args in (["su"], ["-i"]):
+                self.root = True
+                return "", 0
+            return self.run_command(args, "", background)
+        if name == "nohup":
+            self.write("nohup: ignoring input and appending output to 'nohup.out'\n")
+            return self.run_command(args, "", background)
+        key = " ".join(argv)
+        if key in self.outputs:
+            return self.outputs[key], 0
+        handler = getattr(self, "cmd_" + name.lstrip("./").replace("-", "_").replace(".", "_"), None)
+        if handler is None:
+            return f"{name}: command not found", 127
+        return handler(args, background)
+
+    def needs_root(self):
+        return None if self.root else ("Operation not permitted", 1)
+
+    def cmd_echo(self, args, background):
+        return " ".join(args), 0
+
+    def cmd_true(self, args, background):
+        return "", 0
+
+    def cmd_false(self, args, background):
+        return "", 1
+
+    def cmd_id(self, args, background):
+        uid = 0 if self.root else 1000
+        if args == ["-u"]:
+            return str(uid), 0
+        return f"uid={uid}({'root' if self.root else 'ubuntu'}) gid={uid}", 0
+
+    def cmd_exit(self, args, background):
+        if self.root:
+            self.root = False
+        else:
+            self.state = "login"
+            self.write("\nubuntu login: ")
+        return "", 0
+
+    def cmd_rm(self, args, background):
+        return "", 0
+
+    def cmd_eMMC_aggressive_3mins_sh(self, args, background):
+        return "", 0
+
+    def cmd_stress_ng(self, args, background):
+        timeout = 60.0
+        if "--timeout" in args:
+            value = args[args.index("--timeout") + 1]
+            timeout = float(value.rstrip("smh")) * {"s": 1, "m": 60, "h": 3600}.get(value[-1], 1)
+        if not self.stressed():
+            self.stress_since = time.monotonic()
+        self.stress_until = max(self.stress_until, time.monotonic() + self.scaled(timeout))
+        if not background:
+            time.sleep(self.scaled(timeout))
+        return "stress-ng: info:  [4242] dispatching hogs", 0
+
+    def stressed(self):
+        return time.monotonic() < self.stress_until
+
+    def temperature(self, offset=0.0):
+        """Idle 45 °C, heating towards 78 °C under stress with a 60 s (emulated) time constant."""
+        heat = 0.0
+        if self.stressed():
+            heat = 33.0 * (1 - math.exp(-(time.monotonic() - self.stress_since) * self.args.speed / 60.0))
+        return 45.0 + heat + offset + self.rng.uniform(-1.5, 1.5)
+
+    def sensor_chips(self):
+        """Chips as `sensors -j` reports them: {chip: {"Adapter": ..., label: {"tempN_input": ..., ...}}}."""
+        chips = {"coretemp-isa-0000": {"Adapter": "ISA adapter", "Package id 0": {
+            "temp1_input": round(self.temperature(1), 1), "temp1_max": 80.0, "temp1_crit": 100.0}}}
+        for core in range(self.args.cpus):
+            chips["coretemp-isa-0000"][f"Core {core}"] = {
+                f"temp{core + 2}_input": round(self.temperature(), 1), f"temp{core + 2}_max": 80.0,
+                f"temp{core + 2}_crit": 100.0}
+        chips["acpitz-acpi-0"] = {"Adapter": "ACPI interface", "temp1": {
+            "temp1_input": round(self.temperature(-17), 1), "temp1_crit": 105.0}}
+        chips["nvme-pci-0100"] = {"Adapter": "PCI adapter", "Composite": {
+            "temp1_input": round(self.temperature(-6), 1), "temp1_min": -273.1, "temp1_max": 84.8}}
+        return chips
+
+    def cmd_sensors(self, args, background):
+        if "sensors" in self.outputs:
+            return self.outputs["sensors"], 0
+        if "-j" in args:
+            if self.args.no_json:
+                return "sensors: invalid option -- 'j'", 1
+            return json.dumps(self.sensor_chips(), indent=3), 0
+        lines = []
+        for chip, features in self.sensor_chips().items():
+            lines += [chip, f"Adapter: {features.pop('Adapter')}"]
+            for label, values in features.items():
+                value = next(value for key, value in values.items() if key.endswith("_input"))
+                limits = ", ".join(f"{SENSOR_LIMITS[key.partition('_')[2]]} = {limit:+.1f}°C"
+                                   for key, limit in values.items() if not key.endswith("_input"))
+                lines.append(f"{label + ':':<14}{value:+.1f}°C  ({limits})")
+            lines.append("")
+        return "\n".join(lines).rstrip(), 0
+
+    def cmd_free(self, args, background):
+        used = 6.9 if self.stressed() else 1.2
+        return ("               total        used        free      shared  buff/cache   available\n"
+                f"Mem:           7.6Gi       {used:.1f}Gi       {7.6 - used - 0.6:.1f}Gi        12Mi       654Mi       {7.6 - used:.1f}Gi\n"
+                "Swap:          2.0Gi          0B       2.0Gi"), 0
+
+    def cmd_mpstat(self, args, background):
+        as_json = args[:2] == ["-o", "JSON"]
+        if as_json:
+            if self.args.no_json:
+                return "Usage: mpstat [ options ] [ <interval> [ <count> ] ]", 1
+            args = args[2:]
+        numbers = [float(arg) for arg in args if arg.replace(".", "", 1).isdigit()]
+        interval, count = (numbers + [1, 1])[:2] if numbers else (1, 1)
+        time.sleep(self.scaled(interval * count))
+        stamp = time.strftime("%H:%M:%S")
+        fields = ["usr", "nice", "sys", "iowait", "irq", "soft", "steal", "guest", "gnice", "idle"]
+        loads = []
+        for cpu in ["all"] + [str(n) for n in range(self.args.cpus)]:
+            usr = 96.0 if self.stressed() else self.rng.uniform(0.5, 3.0)
+            sys_ = 3.0 if self.stressed() else self.rng.uniform(0.2, 1.0)
+            idle = max(100.0 - usr - sys_ - 0.25, 0.0)
+            loads.append(dict(zip(["cpu"] + fields, [cpu, usr, 0.0, sys_, 0.0, 0.0, 0.25, 0.0, 0.0, 0.0, idle])))
+        if as_json:
+            return json.dumps({"sysstat": {"hosts": [{
+                "nodename": "ubuntu", "sysname": "Linux", "release": "5.15.0-105-generic", "machine": "x86_64",
+                "number-of-cpus": self.args.cpus, "date": time.strftime("%m/%d/%y"),
+                "statistics": [{"timestamp": stamp, "cpu-load": [
+                    {key: round(value, 2) if key != "cpu" else value for key, value in load.items()}
+                    for load in loads]}]}]}}, indent=1), 0
+        header = "CPU    %usr   %nice    %sys %iowait    %irq   %soft  %steal  %guest  %gnice   %idle"
+        rows = [f"{load['cpu']:>5} " + " ".join(f"{load[field]:7.2f}" for field in fields) for load in loads]
+        lines = [f"Linux 5.15.0-105-generic (ubuntu) \t{time.strftime('%m/%d/%y')} \t_x86_64_\t({self.args.cpus} CPU)", "",
+                 f"{stamp} {header}"] + [f"{stamp} {row}" for row in rows] + ["", f"Average: {header}"] + \
+                [f"Average: {row}" for row in rows]
+        return "\n".join(lines), 0
+
+    # --- network
+
+    def link_up(self, iface):
+        up_at = self.links.get(iface)
+        return up_at is not None and time.monotonic() >= up_at
+
+    def cpu_frequency(self):
+        """scaling_cur_freq in kHz: low at idle, all-core turbo under stress, below base when throttling."""
+        if not self.stressed():
+            return self.rng.randrange(800000, 1200000, 1000)
+        if self.throttles and self.temperature(1) >= PASSIVE_TRIP:
+            return self.rng.randrange(1400000, 1600000, 1000)
+        return self.rng.randrange(2400000, 2600000, 1000)
+
+    def sysfs_paths(self):
+        """Every emulated sysfs file, for glob expansion."""
+        paths = [f"/sys/class/net/{iface}/{attribute}" for iface in INTERFACES
+                 for attribute in ("operstate", "carrier", "speed")]
+        paths += [f"/sys/devices/system/cpu/cpu{cpu}/cpufreq/{attribute}" for cpu in range(self.args.cpus)
+                  for attribute in ("scaling_cur_freq", "base_frequency", "cpuinfo_max_freq")]
+        for zone, (_, _, trips) in THERMAL_ZONES.items():
+            paths += [f"/sys/class/thermal/{zone}/type", f"/sys/class/thermal/{zone}/temp"]
+            paths += [f"/sys/class/thermal/{zone}/trip_point_{n}_{attribute}" for n in range(len(trips))
+                      for attribute in ("temp", "type")]
+        return paths
+
+    def sysfs(self, path):
+        """Returns (content, error) of an emulated sysfs file: /sys/class/net/<iface>/{operstate,carrier,speed},
+        the cpufreq files of each CPU or a thermal zone file."""
+        match = re.fullmatch(r"/sys/devices/system/cpu/cpu(\d+)/cpufreq/(scaling_cur_freq|base_frequency|cpuinfo_max_freq)",
+                             path)
+        if match and int(match.group(1)) < self.args.cpus:
+            limits = {"base_frequency": CPU_BASE_FREQ, "cpuinfo_max_freq": CPU_MAX_FREQ}
+            return str(limits.get(match.group(2)) or self.cpu_frequency()), None
+        match = re.fullmatch(r"/sys/class/thermal/(thermal_zone\d+)/(type|temp|trip_point_(\d+)_(temp|type))", path)
+        if match and match.group(1) in THERMAL_ZONES:
+            zone_type, offset, trips = THERMAL_ZONES[match.group(1)]
+            if match.group(2) == "type":
+                return zone_type, None
+            if match.group(2) == "temp":
+                return str(int(self.temperature(offset) * 1000)), None
+            if int(match.group(3)) < len(trips):
+                trip_type, trip_temp = trips[int(match.group(3))]
+                return (trip_type if match.group(4) == "type" else str(int(trip_temp * 1000))), None
+        match = re.fullmatch(r"/sys/class/net/([^/]+)/(operstate|carrier|speed)", path)
+        if not match or match.group(1) not in INTERFACES:
+            return None, "No such file or directory"
+        iface, attribute = match.groups()
+        admin_up, up = iface in self.links, self.link_up(iface)
+        if attribute == "operstate":
+            return ("up" if up else "down"), None
+        if not admin_up:
+            return None, "Invalid argument"
+        if attribute == "carrier":
+            return ("1" if up else "0"), None
+        return ("1000" if up else "-1"), None
+
+    def read_file(self, path):
+        """Returns (content, error) of a file written by a redirect or of an emulated sysfs file."""
+        if path in self.files:
+            return self.files[path].rstrip("\n"), None
+        return self.sysfs(path)
+
+    def cmd_cat(self, args, background):
+        lines, status = [], 0
+        for path in args:
+            content, error = self.read_file(path)
+            if error:
+                lines.append(f"cat: {path}: {error}")
+                status = 1
+            elif content:
+                lines.append(content)
+        return "\n".join(lines), status
+
+    def cmd_grep(self, args, background):
+        if args[:2] != ["-H", "."]:
+            return "grep: only 'grep -H . FILE...' is emulated", 2
+        lines, status = [], 0
+        for path in args[2:]:
+            content, error = self.read_file(path)
+            if error:
+                lines.append(f"grep: {path}: {error}")
+                status = 2
+            else:
+                lines += [f"{path}:{line}" for line in content.splitlines() if line]
+        return "\n".join(lines), status
+
+    def interface_table(self):
+        """Interfaces as `ip -j addr` reports them."""
+        table = [{"ifindex": 1, "ifname": "lo", "flags": ["LOOPBACK", "UP", "LOWER_UP"], "mtu": 65536,
+                  "operstate": "UNKNOWN", "link_type": "loopback", "address": "00:00:00:00:00:00",
+                  "addr_info": [{"family": "inet", "local": "127.0.0.1", "prefixlen": 8}]}]
+        names = INTERFACES + [f"wwan{n}" for n, up in enumerate(self.modems_up) if up]
+        for index, iface in enumerate(names, 2):
+            up = self.link_up(iface)
+            flags = ["BROADCAST", "MULTICAST", "UP", "LOWER_UP"] if up else \
+                ["NO-CARRIER", "BROADCAST", "MULTICAST", "UP"] if iface in self.links else ["BROADCAST", "MULTICAST"]
+            addr_info = [{"family": "inet", "local": address, "prefixlen": self.prefixlens[address]}
+                         for address, owner in self.addresses.items() if owner == iface]
+            table.append({"ifindex": index, "ifname": iface, "flags": flags, "mtu": 1500,
+                          "operstate": "UP" if up else "DOWN", "link_type": "ether",
+                          "address": f"00:11:22:33:44:{index:02x}", "addr_info": addr_info})
+        return table
+
+    def cmd_ip(self, args, background):
+        as_json = "-j" in args
+        if as_json and self.args.no_json:
+            return 'Option "-j" is unknown, try "ip -help".', 255
+        args = [arg for arg in args if arg != "-j"]
+        if args[:2] == ["link", "set"] and len(args) >= 4:
+            iface = args[2]
+            if iface not in INTERFACES or (args[3] == "up" and iface in self.late_nics):
+                self.late_nics.discard(iface)
+                return f'Cannot find device "{iface}"', 1
+            if self.needs_root():
+                return "RTNETLINK answers: Operation not permitted", 2
+            if args[3] == "up" and iface not in self.links:
+                self.links[iface] = None if self.fault("link_down") else \
+                    time.monotonic() + self.scaled(self.args.link_delay)
+            elif args[3] == "down":
+                self.links.pop(iface, None)
+            return "", 0
+        if args[:2] == ["addr", "add"] and "dev" in args:
+            address, _, prefixlen = args[2].partition("/")
+            iface = args[args.index("dev") + 1]
+            if iface not in INTERFACES:
+                return f'Cannot find device "{iface}"', 1
+            if self.needs_root():
+                return "RTNETLINK answers: Operation not permitted", 2
+            if address in self.addresses:
+                return "RTNETLINK answers: File exists", 2
+            self.addresses[address] = iface
+            self.prefixlens[address] = int(prefixlen or 32)
+            return "", 0
+        if args[:1] in (["link"], ["addr"], ["a"]) and args[1:] in ([], ["show"]):
+            table = self.interface_table()
+            if args[0] == "link":
+                table = [{key: value for key, value in entry.items() if key != "addr_info"} for entry in table]
+            if as_json:
+                return json.dumps(table), 0
+            lines = []
+            for entry in table:
+                state = entry["operstate"]
+                lines.append(f"{entry['ifindex']}: {entry['ifname']}: <{','.join(entry['flags'])}> mtu {entry['mtu']} "
+                             f"qdisc mq state {state} mode DEFAULT group default qlen 1000")
+                lines.append(f"    link/{entry['link_type']} {entry['address']} brd ff:ff:ff:ff:ff:ff")
+                for info in entry.get("addr_info", []):
+                    lines.append(f"    inet {info['local']}/{info['prefixlen']} scope global {entry['ifname']}")
+            return "\n".join(lines), 0
+        return 'Usage: ip [ OPTIONS ] OBJECT { COMMAND | help }', 255
+
+    def cmd_ethtool(self, args, background):
+        iface = args[-1] if args else ""
+        as_json = args[:1] == ["--json"]
+        if as_json and self.args.no_json:
+            return "ethtool: bad command line argument(s)\nFor more information run ethtool -h", 1
+        if iface not in INTERFACES:
+            return "Cannot get device settings: No such device", 75
+        up = self.link_up(iface)
+        if as_json:
+            return json.dumps([{"ifname": iface, "supported-ports": ["TP"],
+                                "supported-link-modes": ["10baseT/Half", "10baseT/Full", "100baseT/Half",
+                                                         "100baseT/Full", "1000baseT/Full"],
+                                "auto-negotiation": True, "speed": 1000 if up else -1,
+                                "duplex": "Full" if up else "Unknown! (255)", "port": "Twisted Pair",
+                                "link-detected": up}], indent=4), 0
+        speed, duplex = ("1000Mb/s", "Full") if up else ("Unknown!", "Unknown! (255)")
+        return (f"Settings for {iface}:\n"
+                "\tSupported ports: [ TP ]\n"
+                "\tSupported link modes:   10baseT/Half 10baseT/Full\n"
+                "\t                        100baseT/Half 100baseT/Full\n"
+                "\t                        1000baseT/Full\n"
+                "\tAuto-negotiation: on\n"
+                f"\tSpeed: {speed}\n"
+                f"\tDuplex: {duplex}\n"
+                "\tPort: Twisted Pair\n"
+                f"\tLink detected: {'yes' if up else 'no'}"), 0
+
+    def cmd_ping(self, args, background):
+        count, interval, target = 4, 1.0, args[-1] if args else ""
+        if "-c" in args:
+            count = int(args[args.index("-c") + 1])
+        if "-i" in args:
+            interval = float(args[args.index("-i") + 1])
+        iface = self.addresses.get(target)
+        reachable = iface is not None and self.link_up(iface)
+        lines = [f"PING {target} ({target}) 56(84) bytes of data."]
+        times = []
+        for seq in range(1, count + 1):
+            time.sleep(self.scaled(interval) if seq > 1 else 0)
+            if reachable:
+                rtt = self.rng.uniform(0.25, 0.45)
+                times.append(rtt)
+                lines.append(f"64 bytes from {target}: icmp_seq={seq} ttl=64 time={rtt:.3f} ms")
+            else:
+                lines.append(f"From {target} icmp_seq={seq} Destination Host Unreachable")
+        loss = 100 - len(times) * 100 // count
+        lines += ["", f"--- {target} ping statistics ---",
+                  f"{count} packets transmitted, {len(times)} received, {loss}% packet loss, time {int((count - 1) * interval * 1000)}ms"]
+        if times:
+            mean = sum(times) / len(times)
+            mdev = (sum((t - mean) ** 2 for t in times) / len(times)) ** 0.5
+            lines.append(f"rtt min/avg/max/mdev = {min(times):.3f}/{mean:.3f}/{max(times):.3f}/{mdev:.3f} ms")
+        return "\n".join(lines), 0 if times else 1
+
+    def cmd_iperf3(self, args, background):
+        options = {}
+        for flag in ("-c", "-B", "-p", "-t", "-b"):
+            if flag in args and args.index(flag) + 1 < len(args):
+                options[flag] = args[args.index(flag) + 1]
+        udp, duration = "-u" in args, float(options.get("-t", 10))
+        iface = self.addresses.get(options.get("-B"))
+        if "-c" not in options:
+            return "iperf3: parameter error - must either be a client (-c) or server (-s)", 1
+        if iface is None or not self.link_up(iface):
+            error = "unable to connect to server: No route to host"
+        elif self.fault("iperf_refused"):
+            error = "unable to connect to server: Connection refused"
+        else:
+            error = None
+        if error:
+            return json.dumps({"start": {}, "intervals": [], "end": {}, "error": error}, indent="\t"), 1
+        time.sleep(self.scaled(duration))
+        start = {"connecting_to": {"host": options["-c"], "port": int(options.get("-p", 5201))},
+                 "test_start": {"protocol": "UDP" if udp else "TCP", "num_streams": 1, "duration": int(duration)}}
+        if udp:
+            rate = options.get("-b", "1M")
+            bits = min(float(rate.rstrip("KMG")) * {"K": 1e3, "M": 1e6, "G": 1e9}.get(rate[-1], 1), 949e6)
+            packets = int(bits * duration / 8 / 1448)
+            end = {"sum": {"start": 0, "end": duration, "seconds": duration, "bytes": packets * 1448,
+                           "bits_per_second": bits, "jitter_ms": round(self.rng.uniform(0.01, 0.08), 3),
+                           "lost_packets": 0, "packets": packets, "lost_percent": 0.0, "sender": True}}
+        else:
+            bits = self.rng.uniform(935e6, 942e6)
+            end = {"sum_sent": {"start": 0, "end": duration, "seconds": duration, "bytes": int(bits * duration / 8),
+                                "bits_per_second": bits + 1.5e6, "retransmits": self.rng.randint(0, 30),
+                                "sender": True},
+                   "sum_received": {"start": 0, "end": duration, "seconds": duration,
+                                    "bytes": int(bits * duration / 8), "bits_per_second": bits, "sender": True}}
+        return json.dumps({"start": start, "intervals": [], "end": end}, indent="\t"), 0
+
+    # --- USB, storage and modems
+
+    def cmd_ls(self, args, background):
+        if any(arg.startswith("/dev/sd") for arg in args):
+            if not self.usb_present:
+                return "ls: cannot access '/dev/sd*': No such file or directory", 2
+            return "/dev/sda  /dev/sda1", 0
+        return "", 0
+
+    def cmd_lsblk(self, args, background):
+        disks = [{"name": "mmcblk0", "type": "disk", "size": "58.2G", "tran": None,
+                  "children": [{"name": f"mmcblk0p{n}", "type": "part", "size": "19.4G", "tran": None} for n in (1, 2, 3)]}]
+        if self.usb_present:
+            disks.insert(0, {"name": "sda", "type": "disk", "size": "28.7G", "tran": "usb",
+                             "children": [{"name": "sda1", "type": "part", "size": "28.7G", "tran": None}]})
+        if "-J" in args:
+            if self.args.no_json:
+                return "lsblk: invalid option -- 'J'", 1
+            return json.dumps({"blockdevices": disks}, indent=3), 0
+        lines, pending = [], list(disks)
+        while pending:
+            disk = pending.pop(0)
+            if "-P" in args:
+                lines.append(f'NAME="{disk["name"]}" TYPE="{disk["type"]}" SIZE="{disk["size"]}" TRAN="{disk["tran"] or ""}"')
+            else:
+                lines.append(f"{disk['name']:<12}{disk['type']:<6}{disk['size']:>7} {disk['tran'] or ''}")
+            pending[:0] = disk.get("children", [])
+        return "\n".join(lines), 0
+
+    def cmd_lsusb(self, args, background):
+        lines = ["Bus 002 Device 001: ID 1d6b:0003 Linux Foundation 3.0 root hub"]
+        device = 2
+        for up in self.modems_up:
+            if up:
+                lines.append(f"Bus 001 Device {device:03d}: ID 1bc7:1201 Telit Wireless Solutions LE910C4-EU")
+                device += 1
+        if self.gps_present:
+            lines.append(f"Bus 001 Device {device:03d}: ID 1546:01a9 U-Blox AG u-blox GNSS receiver")
+            device += 1
+        if self.usb_present:
+            lines.append(f"Bus 001 Device {device:03d}: ID 0781:5581 SanDisk Corp. Ultra")
+        lines.append("Bus 001 Device 001: ID 1d6b:0002 Linux Foundation 2.0 root hub")
+        return "\n".join(lines), 0
+
+    def modem_index(self, args):
+        """The module `-m N` names: ModemManager numbers only the modems present, in order."""
+        if "-m" not in args:
+            return None
+        index = int(args[args.index("-m") + 1])
+        present = [n for n, up in enumerate(self.modems_up) if up]
+        return present[index] if index < len(present) else None
+
+    def modem_properties(self, module):
+        """Properties of a modem as `mmcli -K -m N` lists them; arrays as lists, missing values as "--"."""
+        index = sum(self.modems_up[:module])
+        sim = "--" if self.sims_missing[module] else f"/org/freedesktop/ModemManager1/SIM/{index}"
+        return [("modem.dbus-path", f"/org/freedesktop/ModemManager1/Modem/{index}"),
+                ("modem.generic.device", f"/sys/devices/pci0000:00/0000:00:14.0/usb1/{modem_port(module)}"),
+                ("modem.generic.primary-port", f"cdc-wdm{module}"),
+                ("modem.generic.ports", [f"cdc-wdm{module} (qmi)", f"wwan{module} (net)"]),
+                ("modem.generic.manufacturer", "Telit"),
+                ("modem.generic.model", "LE910C4-EU"),
+                ("modem.generic.state", "connected" if module in self.modems_connected else "registered"),
+                ("modem.generic.power-state", "on"),
+                ("modem.generic.access-technologies", ["lte"]),
+                ("modem.generic.signal-quality.value", "80"),
+                ("modem.generic.signal-quality.recent", "yes"),
+                ("modem.generic.sim", sim),
+                ("modem.generic.sim-slots", [sim, "--"]),
+                ("modem.generic.primary-sim-slot", "1"),
+                ("modem.3gpp.imei", f"35123456789012{module}"),
+                ("modem.3gpp.operator-code", "--" if self.sims_missing[module] else "40445"),
+                ("modem.3gpp.operator-name", "--" if self.sims_missing[module] else "airtel"),
+                ("modem.3gpp.registration-state", "--" if self.sims_missing[module] else "home")]
+
+    def cmd_mmcli(self, args, background):
+        if args == ["-L"]:
+            present = [n for n, up in enumerate(self.modems_up) if up]
+            if not present:
+                return "No modems were found", 0
+            return "\n".join(f"    /org/freedesktop/ModemManager1/Modem/{n} [Telit] LE910C4-EU" for n in range(len(present))), 0
+        module = self.modem_index(args)
+        if module is None:
+            return "error: couldn't find modem", 1
+        if any(arg.startswith("--simple-connect") for arg in args):
+            time.sleep(self.scaled(2.0))
+            if self.sims_missing[module] or self.fault("modem_connect_fail"):
+                return "error: couldn't connect the modem: 'Timeout was reached'", 1
+            self.modems_connected.add(module)
+            return "successfully connected the modem", 0
+        properties = self.modem_properties(module)
+        if "-K" in args:
+            lines = []
+            for key, value in properties:
+                if isinstance(value, list):
+                    lines.append(f"{key + '.length':<48}: {len(value)}")
+                    lines += [f"{key + f'.value[{n}]':<48}: {item}" for n, item in enumerate(value, 1)]
+                else:
+                    lines.append(f"{key:<48}: {value}")
+            return "\n".join(lines), 0
+        values = dict(properties)
+        slots = values["modem.generic.sim-slots"]
+        return (f"  ----------------------------------\n"
+                f"  General  |                   path: {values['modem.dbus-path']}\n"
+                f"  ----------------------------------\n"
+                f"  Hardware |           manufacturer: {values['modem.generic.manufacturer']}\n"
+                f"           |                  model: {values['modem.generic.model']}\n"
+                f"  ----------------------------------\n"
+                f"  Status   |                  state: {values['modem.generic.state']}\n"
+                f"           |            power state: on\n"
+                f"           |            access tech: lte\n"
+                f"           |         signal quality: 80% (recent)\n"
+                f"  ----------------------------------\n"
+                f"  3GPP     |                   imei: {values['modem.3gpp.imei']}\n"
+                f"           |            operator id: {values['modem.3gpp.operator-code']}\n"
+                f"           |          operator name: {values['modem.3gpp.operator-name']}\n"
+                f"           |           registration: {values['modem.3gpp.registration-state']}\n"
+                f"  ----------------------------------\n"
+                f"  SIM      |       primary sim path: {values['modem.generic.sim']}\n"
+                f"           |         sim slot paths: slot 1: {slots[0].replace('--', 'none')} (active)\n"
+                f"           |                         slot 2: none"), 0
+
+
+class RpsHandler(BaseHTTPRequestHandler):
+    """Minimal remote power switch: GET <path>?set_switch=<outlet> <true|false>."""
+
+    duts_by_outlet = {}
+
+    def do_GET(self):
+        switch = parse_qs(urlparse(self.path).query).get("set_switch", [""])[0].split()
+        dut = self.duts_by_outlet.get(switch[0]) if len(switch) == 2 else None
+        if dut is None:
+            self.send_response(400)
+            self.end_headers()
+            return
+        dut.set_power(switch[1].lower() == "true")
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def modem_port(module):
+    """USB port of an LTE module, the end of its `modem.generic.device` path."""
+    return f"1-{3 + module}"
+
+def parse_faults(values):
+    faults = {}
+    for value in values:
+        name, _, probability = value.partition("=")
+        if name not in FAULTS:
+            raise argparse.ArgumentTypeError(f"unknown fault {name!r}, choose from {', '.join(FAULTS)}")
+        faults[name] = float(probability or 1.0)
+    return faults
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duts", type=int, default=1, help="number of boards to emulate")
+    parser.add_argument("--first-outlet", type=int, default=3, help="RPS outlet of the first board")
+    parser.add_argument("--link", help="symlink prefix for the console devices, e.g. /tmp/ttyDUT")
+    parser.add_argument("--rps-port", type=int, default=8000, help="port of the emulated RPS")
+    parser.add_argument("--password", default="ubuntu123")
+    parser.add_argument("--cpus", type=int, default=4)
+    parser.add_argument("--modems", type=int, default=2)
+    parser.add_argument("--boot-delay", type=float, default=70.0, help="emulated seconds from power on to login prompt")
+    parser.add_argument("--link-delay", type=float, default=3.0, help="emulated seconds for an interface to negotiate")
+    parser.add_argument("--latency", type=float, default=0.0, help="wall-clock seconds before each command runs")
+    parser.add_argument("--speed", type=float, default=1.0, help="time acceleration for every emulated duration")
+    parser.add_argument("--no-json", action="store_true",
+                        help="emulate tools too old for JSON output (ip -j, sensors -j, mpstat -o JSON, ethtool --json, lsblk -J)")
+    parser.add_argument("--iperf", action="store_true",
+                        help="emulate an iperf3 peer per interface and enable the throughput test in --config")
+    parser.add_argument("--outputs", help="JSON file mapping command lines to canned output")
+    parser.add_argument("--fault", action="append", default=[], metavar="NAME[=PROBABILITY]",
+                        help="inject a fault: " + "; ".join(f"{k}: {v}" for k, v in FAULTS.items()))
+    parser.add_argument("--seed", type=int, help="seed for reproducible fault injection")
+    parser.add_argument("--config", help="write a NewSystemPowerCyclecode.py config for the emulated boards here")
+    args = parser.parse_args()
+    args.faults = parse_faults(args.fault)
+    if "serial_drop" in args.faults and not args.link:
+        # The re-enumerated pty gets a new /dev/pts path; only the symlink follows it
+        parser.error("the serial_drop fault needs --link, so the console path stays valid across re-enumeration")
+
+    outputs = {}
+    if args.outputs:
+        with open(args.outputs) as f:
+            outputs = json.load(f)
+
+    duts = []
+    for num in range(1, args.duts + 1):
+        link = f"{args.link}{num - 1}" if args.link else None
+        dut = EmulatedDut(f"DUT{num}", str(args.first_outlet + num - 1), link, args, outputs)
+        RpsHandler.duts_by_outlet[dut.outlet] = dut
+        threading.Thread(target=dut.serve, daemon=True).start()
+        duts.append(dut)
+        print(f"{dut.name}: serialDevice {dut.link or dut.device}, outlet {dut.outlet}", flush=True)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.rps_port), RpsHandler)
+    print(f"RPS: apiUrl http://127.0.0.1:{args.rps_port}/rps", flush=True)
+    if args.config:
+        host_config = {"apiUrl": f"http://127.0.0.1:{args.rps_port}/rps", "password": args.password,
+                       "timeScale": 1 / args.speed,
+                       "duts": [{"serialDevice": dut.link or dut.device, "outlet": int(dut.outlet)} for dut in duts],
+                       "modemDevices": [modem_port(module) for module in range(args.modems)]}
+        if args.iperf:
+            host_config["throughputPeers"] = [f"192.168.{n}.1" for n in range(1, len(INTERFACES) + 1)]
+        with open(args.config, "w") as f:
+            json.dump(host_config, f, indent=4)
+        print(f"Host config written to {args.config}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
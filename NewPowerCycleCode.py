@@ -1,3 +1,15 @@
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import Alignment, Font
+import serial
+import time
+import os
+import re
+import select
+import logging
+from datetime import datetime
+import OutputParsers
+
 # API details for power cycling
 apiUrl = "http://172.20.97.2/rps"
 apiUser = "root"
@@ -17,6 +29,10 @@ password = "ubuntu123"
 ipAddresses = ["192.168.1.11", "192.168.2.12", "192.168.3.13", "192.168.4.14", "192.168.5.15", "192.168.6.16", "192.18.7.17", "192.168.8.18"]
 interfaces = ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"]
 
+# Prompts that end a serial read early
+promptPatterns = ["root@ubuntu:", "ubuntu@ubuntu:", "Password:", "ubuntu login:"]
+maxBootTime = 240  # Upper bound for the login prompt to show up after power on
+
 # Set up logging
 logFilename = "consoleLog2.txt"
 logging.basicConfig(filename=logFilename, level=logging.INFO, format="%(asctime)s - %(message)s")
@@ -38,14 +54,56 @@ def cleanOutput(output):
     output = re.sub(r'\x1b\[\?2004[hl]', '', output)
     return output.strip()
 
-def readSerialOutput(ser, timeout=15, command_sent=None, remove_extra_shell=True):
-    output = ""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if ser.inWaiting() > 0:
-            output += ser.read(ser.inWaiting()).decode(errors="ignore")
-        time.sleep(0.1)
-    output = cleanOutput(output)
+def promptAtTail(buffer, prompts):
+    """Returns the prompt shown on the last line of the raw serial buffer, or None"""
+    lastLine = cleanOutput(bytes(buffer[buffer.rfind(b"\n") + 1:]).decode(errors="ignore"))
+    for prompt in prompts:
+        if prompt in lastLine:
+            return prompt
+    return None
+
+def readSerialChunk(ser, wait):
+    """Blocks until serial data arrives or wait seconds pass, and returns the bytes read"""
+    try:
+        fd = ser.fileno()
+    except (AttributeError, OSError):
+        # No pollable descriptor (e.g. Windows): block in read() on the port timeout instead
+        data = ser.read(1)
+        return data + ser.read(ser.inWaiting()) if data else data
+    if not select.select([fd], [], [], max(wait, 0))[0]:
+        return b""
+    return ser.read(ser.inWaiting() or 1)
+
+def readSerialOutput(ser, timeout=15, command_sent=None, remove_extra_shell=True,
+                     prompts=promptPatterns, idle_timeout=None, prompt_settle=0.2, return_reason=False):
+    # Ends on a prompt at the tail (after prompt_settle quiet seconds), on an idle gap of
+    # idle_timeout seconds, or at the timeout hard cap. prompts=None reads the full timeout.
+    buffer = bytearray()
+    reason = "timeout"
+    deadline = time.monotonic() + timeout
+    lastDataTime = time.monotonic()
+    promptSeen = False
+    while True:
+        now = time.monotonic()
+        if promptSeen and now - lastDataTime >= prompt_settle:
+            reason = "prompt"
+            break
+        if idle_timeout and now - lastDataTime >= idle_timeout:
+            reason = "idle"
+            break
+        if now >= deadline:
+            break
+        wakeUp = deadline
+        if promptSeen:
+            wakeUp = min(wakeUp, lastDataTime + prompt_settle)
+        if idle_timeout:
+            wakeUp = min(wakeUp, lastDataTime + idle_timeout)
+        chunk = readSerialChunk(ser, wakeUp - now)
+        if chunk:
+            buffer += chunk
+            lastDataTime = time.monotonic()
+            promptSeen = bool(prompts) and promptAtTail(buffer, prompts) is not None
+    output = cleanOutput(buffer.decode(errors="ignore"))
 
     if command_sent:
         #remove the command and any preceeding or proceeding whitespace.
@@ -53,43 +111,51 @@ def readSerialOutput(ser, timeout=15, command_sent=None, remove_extra_shell=True
 
     if remove_extra_shell:
         output = re.sub(r"^\s*Shell>\s*$", "", output, flags=re.MULTILINE).strip()
+    if return_reason:
+        return output, reason
     return output
 
+def waitForBoot(ser, maxTime, loginPrompt="ubuntu login:"):
+    """Streams the console during boot and returns True as soon as the login prompt shows up"""
+    buffer = bytearray()
+    marker = loginPrompt.encode()
+    deadline = time.monotonic() + maxTime
+    while time.monotonic() < deadline:
+        chunk = readSerialChunk(ser, deadline - time.monotonic())
+        if chunk:
+            searchFrom = max(0, len(buffer) - len(marker) + 1)
+            buffer += chunk
+            if buffer.find(marker, searchFrom) != -1:
+                return True
+    return False
+
 def extractSystemStats(output):
-    #Extracts CPU Usage, Temperature, and Memory Usage from console output
-    cpuUsage, temperature, memoryUsage = "Not Found", "Not Found", "Not Found"
+    #Extracts CPU Usage (%), Temperature (°C), and Memory Usage (%) from console output, None if not found
+    cpuUsage, temperature, memoryUsage = None, None, None
     output = output.replace("\r", "").replace("\n", "").replace(" ", " ")
     match = re.search(r"Usage of /:\s+([\d.]+%)", output)
     if match:
-        cpuUsage = match.group(1)
+        cpuUsage, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Temperature:\s+([\d.]+ C)", output)
     if match:
-        temperature = match.group(1)
+        temperature, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Memory usage:\s+([\d.]+%)", output)
     if match:
-        memoryUsage = match.group(1)
+        memoryUsage, _ = OutputParsers.parse_quantity(match.group(1))
     return cpuUsage, temperature, memoryUsage
 
 def parseFreeOutput(output, prefix):
-    """Parses the output of the free -h command."""
+    """Parses the output of the free -h command, in bytes ("1.2Gi" -> 1288490188.8)."""
     lines = output.splitlines()
-    if len(lines) < 2:
-        return {}
-
-    headers = lines[0].split()
-    data = lines[1].split()
+    headers = next((line.split() for line in lines if line.split()[:1] == ["total"]), [])
 
     result = {}
-    for i, header in enumerate(headers):
-        if i < len(data):
-            result[f"{prefix} mem {header.lower()}"] = data[i]
-
-    if len(lines) > 2:
-        swapHeaders = lines[0].split()
-        swapData = lines[2].split()
-        for i, header in enumerate(swapHeaders):
-            if i < len(swapData):
-                result[f"{prefix} swap {header.lower()}"] = swapData[i]
+    for line in lines:
+        parts = line.split()
+        if parts[:1] in (["Mem:"], ["Swap:"]):
+            kind = parts[0][:-1].lower()
+            for header, value in zip(headers, parts[1:]):
+                result[f"{prefix} {kind} {header.lower()} (B)"], _ = OutputParsers.parse_quantity(value)
     return result
 
 # Ensure Excel file exists
@@ -101,13 +167,13 @@ wb = Workbook()
 ws = wb.active
 
 # Start with a minimal header (interfaces will be added later)
-header = ["Iteration", "Timestamp", "CPU Usage", "CPU Temperature", "Memory Usage", "Power Cycle Status", "USB Status", "GPS Status"]
+header = ["Iteration", "Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "Memory Usage (%)", "Power Cycle Status", "USB Status", "GPS Status"]
 # Add interface columns to header
 headerExtend = ["LTE1 Status", "LTE2 Status", "SIM1 Status", "SIM2 Status", "Modem1 Connection Status",
                 "Modem2 Connection Status", "SIM1 Operator Name", "SIM2 Operator Name", "SIM1 Registration",
                 "SIM2 Registration"]
 for iface in interfaces:
-    headerExtend.extend([f"{iface} Ethernet Detected", f"{iface} Speed", f"{iface} Ping Result"])
+    headerExtend.extend([f"{iface} Ethernet Detected", f"{iface} Speed (bit/s)", f"{iface} Ping Result"])
 
 sensorHeaders = []
 freeHeaders = []
@@ -189,40 +255,49 @@ for ite in range(1, iteration + 1):
         time.sleep(onDuration)
     '''
     logMessage("Reboot cycle completed.")
-    
-    logMessage("Waiting for 240 seconds for device reboot...")
-    time.sleep(240)
 
-    # Establish serial connection
+    # Establish serial connection right away so the whole boot is streamed
     logMessage("Re-establishing serial connection...")
-    try:
-        ser = serial.Serial(serialDevice, baudRate, timeout=1)
-        time.sleep(2)
-    except serial.SerialException as e:
-        logMessage(f"Error opening serial port: {e}")
+    bootStart = time.monotonic()
+    ser = None
+    while ser is None:
+        try:
+            ser = serial.Serial(serialDevice, baudRate, timeout=1)
+        except serial.SerialException as e:
+            if time.monotonic() - bootStart >= maxBootTime:
+                logMessage(f"Error opening serial port: {e}")
+                break
+            time.sleep(1)  # USB-serial adapter may still be enumerating
+    if ser is None:
         continue
 
+    logMessage(f"Waiting up to {maxBootTime} seconds for device reboot...")
+    if waitForBoot(ser, maxBootTime - (time.monotonic() - bootStart)):
+        logMessage(f"Device booted in {time.monotonic() - bootStart:.1f} seconds.")
+    else:
+        logMessage(f"'ubuntu login:' not seen within {maxBootTime} seconds of power on.")
+
     # Ensure login prompt
     logMessage("Checking for'ubuntu login:' prompt...")
     ser.write(b"\n" * 5)
-    output = readSerialOutput(ser, 30, remove_extra_shell=False)
+    output, reason = readSerialOutput(ser, 30, remove_extra_shell=False, return_reason=True)
     if "ubuntu login:" not in output:
-        logMessage("[ERROR] 'ubuntu login:' not detected, skipping this iteration.")
+        logMessage(f"[ERROR] 'ubuntu login:' not detected (read ended on {reason}), skipping this iteration.")
         continue
 
     # Enter credentials
     logMessage("Logging in...")
     ser.write(f"{username}\n".encode())
-    output = readSerialOutput(ser, 10, remove_extra_shell=False)
+    output, reason = readSerialOutput(ser, 10, remove_extra_shell=False, return_reason=True)
     if "Password:" not in output:
-        logMessage("[ERROR] Password prompt not detected, skipping this iteration.")
+        logMessage(f"[ERROR] Password prompt not detected (read ended on {reason}), skipping this iteration.")
         continue
     ser.write(f"{password}\n".encode())
-    output = readSerialOutput(ser, 10)
+    output, reason = readSerialOutput(ser, 10, return_reason=True)
 
     # Check for login prompt
     if "root@ubuntu:" not in output and "ubuntu@ubuntu:" not in output:
-        logMessage("[ERROR] Login failed, skipping this iteration.")
+        logMessage(f"[ERROR] Login failed (read ended on {reason}), skipping this iteration.")
         continue
 
     # Extract system stats
@@ -248,29 +323,13 @@ for ite in range(1, iteration + 1):
 
     # Sensor data collection (before stress-ng)
     logMessage("Collecting sensor data (before stress-ng)...")
+    ser.reset_input_buffer()  # drop prompts left by the unread commands above
     ser.write(b"sensors\n")
     sensorsOutput = readSerialOutput(ser, 10)
     logMessage(sensorsOutput)
 
-    lines = sensorsOutput.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensorName = parts[0].strip()
-            sensorValue = parts[1].split("(")[0].strip()
-
-            fullSensorName = sensorName
-            if i > 0 and "Adapter:" in lines[i - 1]:
-                fullSensorName = "before stress-ng " + lines[i - 2].strip() + " " + lines[i - 1].split(":")[1].strip() + " " + sensorName
-            elif i > 0 and "Core" in sensorName:
-                fullSensorName = "before stress-ng " + sensorName
-            else:
-                fullSensorName = "before stress-ng " + sensorName
-
-            sensorsData[fullSensorName] = sensorValue
-        i += 1
+    for sensorName, (sensorValue, unit) in OutputParsers.parse_sensors_text(sensorsOutput).items():
+        sensorsData[OutputParsers.with_unit("before stress-ng " + sensorName, unit)] = sensorValue
 
     # Memory usage details (free -h) (before stress-ng)
     logMessage("Collecting memory usage details (free -h) (before stress-ng)...")
@@ -287,25 +346,10 @@ for ite in range(1, iteration + 1):
     mpstatOutput = readSerialOutput(ser, 10)
     logMessage(mpstatOutput)
 
-    mpstatLines = mpstatOutput.splitlines()
-    for line in mpstatLines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":  # Add this condition
-                cpuName = parts[1]
-                mpstatDetails = {
-                    f"before stress-ng average CPU {cpuName} %usr": parts[2],
-                    f"before stress-ng average CPU {cpuName} %nice": parts[3],
-                    f"before stress-ng average CPU {cpuName} %sys": parts[4],
-                    f"before stress-ng average CPU {cpuName} %iowait": parts[5],
-                    f"before stress-ng average CPU {cpuName} %irq": parts[6],
-                    f"before stress-ng average CPU {cpuName} %soft": parts[7],
-                    f"before stress-ng average CPU {cpuName} %steal": parts[8],
-                    f"before stress-ng average CPU {cpuName} %guest": parts[9],
-                    f"before stress-ng average CPU {cpuName} %gnice": parts[10],
-                    f"before stress-ng average CPU {cpuName} %idle": parts[11],
-                }
-                mpstatData.update(mpstatDetails)
+    # Average: rows only, so 12-hour (AM/PM) timestamps do not shift the columns
+    for cpuName, stats in OutputParsers.parse_mpstat_text(mpstatOutput).items():
+        for field, value in stats.items():
+            mpstatData[f"before stress-ng average CPU {cpuName} %{field}"] = value
 
     # stress-ng commands
     logMessage("Starting stress-ng commands...")
@@ -317,29 +361,13 @@ for ite in range(1, iteration + 1):
 
     # Sensor data collection (after stress-ng)
     logMessage("Collecting sensor data (after stress-ng)...")
+    ser.reset_input_buffer()  # drop prompts left by the unread commands above
     ser.write(b"sensors\n")
     sensorsOutput = readSerialOutput(ser, 10)
     logMessage(sensorsOutput)
 
-    lines = sensorsOutput.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensorName = parts[0].strip()
-            sensorValue = parts[1].split("(")[0].strip()
-
-            fullSensorName = sensorName
-            if i > 0 and "Adapter:" in lines[i - 1]:
-                fullSensorName = "after stress-ng " + lines[i - 2].strip() + " " + lines[i - 1].split(":")[1].strip() + " " + sensorName
-            elif i > 0 and "Core" in sensorName:
-                fullSensorName = "after stress-ng " + sensorName
-            else:
-                fullSensorName = "after stress-ng " + sensorName
-
-            sensorsData[fullSensorName] = sensorValue
-        i += 1
+    for sensorName, (sensorValue, unit) in OutputParsers.parse_sensors_text(sensorsOutput).items():
+        sensorsData[OutputParsers.with_unit("after stress-ng " + sensorName, unit)] = sensorValue
 
     # Memory usage details (free -h) (after stress-ng)
     logMessage("Collecting memory usage details (free -h) (after stress-ng)...")
@@ -356,25 +384,10 @@ for ite in range(1, iteration + 1):
     mpstatOutput = readSerialOutput(ser, 10)
     logMessage(mpstatOutput)
 
-    mpstatLines = mpstatOutput.splitlines()
-    for line in mpstatLines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":  # Add this condition
-                cpuName = parts[1]
-                mpstatDetails = {
-                    f"after stress-ng average CPU {cpuName} %usr": parts[2],
-                    f"after stress-ng average CPU {cpuName} %nice": parts[3],
-                    f"after stress-ng average CPU {cpuName} %sys": parts[4],
-                    f"after stress-ng average CPU {cpuName} %iowait": parts[5],
-                    f"after stress-ng average CPU {cpuName} %irq": parts[6],
-                    f"after stress-ng average CPU {cpuName} %soft": parts[7],
-                    f"after stress-ng average CPU {cpuName} %steal": parts[8],
-                    f"after stress-ng average CPU {cpuName} %guest": parts[9],
-                    f"after stress-ng average CPU {cpuName} %gnice": parts[10],
-                    f"after stress-ng average CPU {cpuName} %idle": parts[11],
-                }
-                mpstatData.update(mpstatDetails)
+    # Average: rows only, so 12-hour (AM/PM) timestamps do not shift the columns
+    for cpuName, stats in OutputParsers.parse_mpstat_text(mpstatOutput).items():
+        for field, value in stats.items():
+            mpstatData[f"after stress-ng average CPU {cpuName} %{field}"] = value
 
     # Update sensor headers and data
     sensorHeaders = list(sensorsData.keys())
@@ -418,7 +431,7 @@ for ite in range(1, iteration + 1):
             speedMatch = re.search(r"Speed:\s*(\d+)Mb/s", ethtoolOutput)
 
             linkStatus = "Yes" if linkDetectedMatch else "No"
-            speed = speedMatch.group(0) if speedMatch else "Unknown"
+            speed, _ = OutputParsers.parse_quantity(speedMatch.group(0)) if speedMatch else (None, None)
 
             logMessage(f"Interface {iface} - Link Detected: {linkStatus}, Speed: {speed}")
 
@@ -632,15 +645,15 @@ for ite in range(1, iteration + 1):
 
     # Add sensor data
     for sensor in sensorHeaders:
-        rowData.append(sensorsData.get(sensor, "Sensor Value Not Found"))
+        rowData.append(sensorsData.get(sensor))
 
     # Add free data
     for freeKey in freeHeaders:
-        rowData.append(freeData.get(freeKey, "Sensor Value Not Found"))
+        rowData.append(freeData.get(freeKey))
 
     # Add mpstat data
     for mpstatKey in mpstatHeaders:
-        rowData.append(mpstatData.get(mpstatKey, "Sensor Value Not Found"))
+        rowData.append(mpstatData.get(mpstatKey))
 
     ws.append(rowData)
     wb.save(excelFile)
@@ -1,7 +1,8 @@
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment, Font
-from collections import OrderedDict
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 import serial
 import time
 import os
@@ -11,31 +12,70 @@ import re
 import logging
 from datetime import datetime
 import json
+import sys
+import random
 import subprocess
-
-# Load configuration from JSON file
+import asyncio
+import contextvars
+import uuid
+import math
+import traceback
+from array import array
+import OutputParsers
+
+# Default configuration, also written to config.json when no config is given
+default_config = {
+    "apiUrl": "http://172.20.97.2/rps",
+    "apiUser": "root",
+    "apiPass": "root",
+    "baudRate": 115200,
+    "iteration": 250,
+    "rebootCount": 5,
+    "serialDevice": "/dev/ttyUSB0",
+    "username": "ubuntu",
+    "password": "ubuntu123",
+    "ipAddresses": ["192.168.1.11", "192.168.2.12", "192.168.3.13", "192.168.4.14", "192.168.5.15", "192.168.6.16", "192.168.7.17", "192.168.8.18"],
+    "interfaces": ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"],
+    "maxBootTime": 240,
+    "outlet": 3,
+    "linkTimeout": 20,
+    "pingCount": 10,
+    "pingInterval": 1,
+    "modemApns": ["airtelgprs.com", "airtelgprs.com"],
+    "modemDevices": [],
+    "hardwareRules": {
+        "USB": {"block": ["sda"]},
+        "GPS": {"usb": ["1546:01a9"]},
+        "LTE": {"usb": ["1bc7:*"], "count": 2},
+        "LTE interface": {"interfaces": ["wwan0", "wwan1"], "count": 2}
+    },
+    "throughputPeers": [],
+    "throughputDuration": 10,
+    "throughputUdpBandwidth": "100M",
+    "telemetryInterval": 10,
+    "telemetryDuration": 0,
+    "telemetryTemperature": "coretemp",
+    "telemetryPlateauTolerance": 2.0,
+    "throttleThreshold": 10,
+    "throttleReference": "base_frequency",
+    "timeScale": 1,
+    "traceDir": "traces",
+    "duts": []
+}
+
+# Load configuration from JSON file. A config given on the command line (e.g. the one
+# written by DutEmulator.py) only needs the keys it changes from the defaults.
 jsonFile = "config.json"
-if os.path.exists(jsonFile):
+if len(sys.argv) > 1:
+    jsonFile = sys.argv[1]
+elif os.path.exists(jsonFile):
     os.remove(jsonFile)
 try:
-    with open("config.json", "r") as f:
-        config = json.load(f)
+    with open(jsonFile, "r") as f:
+        config = {**default_config, **json.load(f)}
 except FileNotFoundError:
-    print("Error: config.json not found. Creating a default config.json")
-    default_config = {
-        "apiUrl": "http://172.20.97.2/rps",
-        "apiUser": "root",
-        "apiPass": "root",
-        "baudRate": 115200,
-        "iteration": 250,
-        "rebootCount": 5,
-        "serialDevice": "/dev/ttyUSB0",
-        "username": "ubuntu",
-        "password": "ubuntu123",
-        "ipAddresses": ["192.168.1.11", "192.168.2.12", "192.168.3.13", "192.168.4.14", "192.168.5.15", "192.168.6.16", "192.168.7.17", "192.168.8.18"],
-        "interfaces": ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"]
-    }
-    with open("config.json", "w") as f:
+    print(f"Error: {jsonFile} not found. Creating a default {jsonFile}")
+    with open(jsonFile, "w") as f:
         json.dump(default_config, f, indent=4)
     config = default_config
 
@@ -50,6 +90,50 @@ username = config["username"]
 password = config["password"]
 ipAddresses = config["ipAddresses"]
 interfaces = config["interfaces"]
+maxBootTime = config.get("maxBootTime", 240)
+outlet = config.get("outlet", 3)
+traceDir = config.get("traceDir", "traces")  # one Chrome trace of step spans per DUT and iteration
+linkTimeout = config.get("linkTimeout", 20)  # seconds for all interface links to come up
+pingCount = config.get("pingCount", 10)
+pingInterval = config.get("pingInterval", 1)  # seconds between echo requests (ping -i)
+modemApns = config.get("modemApns", ["airtelgprs.com", "airtelgprs.com"])  # APN per modem, the last one for any further modem
+# Physical module of each Modem/SIM column: its `modem.generic.device` sysfs path, or just the USB port
+# at its end (e.g. "1-3"). Without it the modems found fill the columns in device path order.
+modemDevices = config.get("modemDevices", [])
+# Expected devices, checked against the hardware inventory of each iteration: USB IDs as
+# "vendor:product" ("vendor:*" for any product), block device names and network interface names
+hardwareRules = config.get("hardwareRules", default_config["hardwareRules"])
+# Optional throughput stage: iperf3 peer per interface (in the order of "interfaces"), each running
+# `iperf3 -s -p <5201 + n>` for the n-th interface. Without peers the stage is skipped.
+throughputPeers = config.get("throughputPeers", [])
+throughputDuration = config.get("throughputDuration", 10)  # seconds of each TCP and UDP test
+throughputUdpBandwidth = config.get("throughputUdpBandwidth", "100M")  # UDP send rate (iperf3 -b)
+# Telemetry during stress-ng: sensors, free -h and mpstat every telemetryInterval seconds, for at
+# least telemetryDuration seconds of stress (0: until the checks of the iteration are done)
+telemetryInterval = config.get("telemetryInterval", 10)
+telemetryDuration = config.get("telemetryDuration", 0)
+telemetryTemperature = config.get("telemetryTemperature", "coretemp")  # sensors whose hottest reading is summarized
+telemetryPlateauTolerance = config.get("telemetryPlateauTolerance", 2.0)  # °C around the final level that counts as plateau
+throttleThreshold = config.get("throttleThreshold", 10)  # % below throttleReference at which a core counts as throttled
+# Frequency a core is measured against: "base_frequency" (cpufreq's, else cpuinfo_max_freq, else the peak),
+# "cpuinfo_max_freq" (the single-core turbo maximum on most x86, which all-core stress never reaches) or "peak"
+# (the highest frequency the core reached during the iteration)
+throttleReference = config.get("throttleReference", "base_frequency")
+timeScale = config.get("timeScale", 1)  # scales the fixed waits; below 1 only against DutEmulator.py
+
+# Fleet mode: each "duts" entry may override the single-board settings above.
+# Without a "duts" list the single board from the top-level settings is driven.
+duts = []
+for dut_num, dut_config in enumerate(config.get("duts") or [{}], 1):
+    dut = {"id": f"DUT{dut_num}", "serialDevice": serialDevice, "outlet": outlet, "username": username,
+           "password": password, "interfaces": interfaces, "ipAddresses": ipAddresses,
+           "modemApns": modemApns, "modemDevices": modemDevices, "hardwareRules": hardwareRules,
+           "throughputPeers": throughputPeers}
+    dut.update(dut_config)
+    dut["modemApns"] = dut["modemApns"] or default_config["modemApns"]  # an empty list would leave modems without APN
+    # Modem columns of the DUT's sheet, fixed for the run: one per modem device, else per expected LTE module
+    dut.setdefault("modemColumns", len(dut["modemDevices"]) or dut["hardwareRules"].get("LTE", {}).get("count", 0))
+    duts.append(dut)
 
 # Set up logging
 logFilename = "consoleLog2.txt"
@@ -59,8 +143,19 @@ with open(logFilename, "w") as logFile:
     logFile.write("Starting new log...\n")
 
 
-def log_message(message, level=logging.INFO):
-    """Logs messages to consoleLog.txt and prints to console."""
+# ID of the DUT the current task is driving, used to tag log lines
+current_dut = contextvars.ContextVar("current_dut", default=None)
+
+def log_message(message, level=logging.INFO, exc_info=False):
+    """Logs messages to consoleLog.txt and prints to console, tagged with the current DUT.
+
+    With exc_info the traceback of the exception being handled is appended.
+    """
+    if exc_info:
+        message = f"{message}\n{traceback.format_exc().rstrip()}"
+    dut_id = current_dut.get()
+    if dut_id:
+        message = "\n".join(f"[{dut_id}] {line}" for line in str(message).split("\n"))
     logging.log(level, message)
     print(message)
 
@@ -70,77 +165,470 @@ def clean_output(output):
     output = re.sub(r'\x1b\[\?2004[hl]', '', output)
     return output.strip()
 
-def read_serial_output(ser, timeout=15, command_sent=None, remove_extra_shell=True):
-    """Reads and cleans serial output."""
-    output = ""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if ser.inWaiting() > 0:
-            output += ser.read(ser.inWaiting()).decode(errors="ignore")
-        time.sleep(0.1)
-    output = clean_output(output)
-
-    if command_sent:
-        escaped_command = re.escape(command_sent)
-        output = re.sub(rf"^\s*{escaped_command}\s*$", "", output, flags=re.MULTILINE).strip()
-    return output
+async def read_serial_chunk(ser, wait):
+    """Waits until serial data arrives or wait seconds pass, and returns the bytes read.
+
+    The port descriptor is watched by the event loop, so any number of consoles can
+    wait at once without a thread each.
+    """
+    try:
+        fd = ser.fileno()
+    except (AttributeError, OSError):
+        # No pollable descriptor (e.g. Windows): block in read() on the port timeout in a worker thread instead
+        data = await asyncio.to_thread(ser.read, 1)
+        return data + ser.read(ser.inWaiting()) if data else data
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    try:
+        await asyncio.wait_for(readable, max(wait, 0))
+    except asyncio.TimeoutError:
+        return b""
+    finally:
+        loop.remove_reader(fd)
+    return ser.read(ser.inWaiting() or 1)
+
+class ConsoleSession:
+    """Serial console of the DUT, kept open for the whole run.
+
+    Bytes that have been read but not consumed stay in the session buffer for the
+    next call, and the port is reopened transparently when the USB-serial adapter
+    goes away and re-enumerates (e.g. across power cycles). Reads, writes and waits
+    are coroutines, so one event loop drives the consoles of the whole fleet.
+    """
+
+    def __init__(self, device, baud_rate, reconnect_timeout=10):
+        self.device = device
+        self.baud_rate = baud_rate
+        self.reconnect_timeout = reconnect_timeout
+        self.ser = None
+        self.buffer = bytearray()
+        self.is_root = False
+        # Per current_track, so the sampler's reads are not charged to the step open on the main track
+        self.bytes_read = Counter()
+        self.read_reasons = defaultdict(Counter)  # how reads ended: "prompt", "timeout", or "error" for a lost port
+        self.text_queries = set()  # queries whose JSON mode the DUT's tools rejected this iteration
+        self.lock = asyncio.Lock()  # one command at a time, e.g. while the telemetry sampler runs
+
+    def connect(self):
+        """Opens the port if it is closed and returns whether it is usable."""
+        if self.ser is None:
+            try:
+                self.ser = serial.Serial(self.device, self.baud_rate, timeout=1)
+            except serial.SerialException:
+                return False
+            log_message(f"Serial port {self.device} opened.")
+        return True
+
+    def disconnect(self, error=None):
+        """Closes the port; the next send or read reopens it."""
+        if error is not None:
+            log_message(f"Serial port {self.device} lost ({error}), reconnecting...", level=logging.WARNING)
+            self.read_reasons[current_track.get()]["error"] += 1
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.ser = None
+
+    async def _fill(self, wait):
+        """Waits up to wait seconds for console data and appends it to the buffer."""
+        if not self.connect():
+            await asyncio.sleep(max(min(wait, 1), 0))  # adapter still enumerating
+            return 0
+        try:
+            chunk = await read_serial_chunk(self.ser, wait)
+        except (serial.SerialException, OSError) as e:
+            self.disconnect(e)
+            return 0
+        self.buffer += chunk
+        self.bytes_read[current_track.get()] += len(chunk)
+        return len(chunk)
+
+    async def send(self, text, newline=True):
+        """Writes text (plus a newline) to the console and returns whether it was written."""
+        data = (text + "\n" if newline else text).encode()
+        deadline = time.monotonic() + self.reconnect_timeout
+        while True:
+            if self.connect():
+                try:
+                    self.ser.write(data)
+                    return True
+                except (serial.SerialException, OSError) as e:
+                    self.disconnect(e)
+            if time.monotonic() >= deadline:
+                log_message(f"Could not write to {self.device}, port unavailable.", level=logging.ERROR)
+                return False
+            await asyncio.sleep(1)
+
+    def discard(self):
+        """Drops buffered and pending input, e.g. prompts of commands that were not read."""
+        self.buffer.clear()
+        if self.ser is not None:
+            try:
+                self.ser.reset_input_buffer()
+            except Exception as e:  # a vanished port raises termios.error here, which is not an OSError
+                self.disconnect(e)
+
+    async def expect(self, patterns, timeout=15):
+        """Waits for any of the patterns anywhere in the console stream.
+
+        Returns the cleaned output up to and including the first match together with
+        "prompt", or everything read and "timeout". Bytes after the match stay
+        buffered for the next call.
+        """
+        markers = [pattern.encode() for pattern in patterns]
+        longest = max(len(marker) for marker in markers)
+        deadline = time.monotonic() + timeout
+        search_from = 0
+        while True:
+            ends = [pos + len(marker) for marker in markers
+                    for pos in [self.buffer.find(marker, search_from)] if pos != -1]
+            if ends:
+                output = self.buffer[:min(ends)]
+                del self.buffer[:min(ends)]
+                self.read_reasons[current_track.get()]["prompt"] += 1
+                return clean_output(output.decode(errors="ignore")), "prompt"
+            now = time.monotonic()
+            if now >= deadline:
+                output = clean_output(self.buffer.decode(errors="ignore"))
+                self.buffer.clear()
+                self.read_reasons[current_track.get()]["timeout"] += 1
+                return output, "timeout"
+            search_from = max(0, len(self.buffer) - longest + 1)
+            await self._fill(deadline - now)
+
+    async def run(self, command, timeout=15):
+        """Runs a shell command on the DUT and returns its output and exit status.
+
+        The command is framed by begin/end markers unique to this call; the markers
+        are split with '' on the command line so its echo never matches them. The
+        call returns as soon as the end marker and $? arrive, with exactly the text
+        printed in between. The status is None if the command did not finish within
+        timeout.
+        """
+        token = uuid.uuid4().hex[:12]
+        begin_marker, end_marker = f"__B{token}__", f"__E{token}__"
+        separator = " " if command.rstrip().endswith("&") else "; "
+        async with self.lock:
+            deadline = time.monotonic() + timeout
+            await self.send(f"echo __B''{token}__; {command}{separator}echo __E''{token}__ $?")
+            _, reason = await self.expect([begin_marker], timeout)
+            if reason != "prompt":
+                return "", None
+            output, reason = await self.expect([end_marker], deadline - time.monotonic())
+            if reason != "prompt":
+                return output, None
+            status, reason = await self.expect(["\n"], deadline - time.monotonic())
+        output = output[:-len(end_marker)].strip()
+        return output, int(status) if reason == "prompt" and status.isdigit() else None
+
+    async def become_root(self, password, timeout=10, root_prompt="root@ubuntu:"):
+        """Turns the logged-in shell into a root shell once per boot and checks it is root.
+
+        Later commands run directly in that shell, without sudo or password prompts.
+        """
+        if not self.is_root:
+            uid, _ = await self.run("id -u", timeout)
+            if uid != "0":
+                await self.send("sudo su")
+                output, reason = await self.expect(["password for", root_prompt], timeout)
+                if reason == "prompt" and output.endswith("password for"):
+                    await self.send(password)
+                uid, _ = await self.run("id -u", timeout)
+            self.is_root = uid == "0"
+        return self.is_root
+
+    async def wait_for_boot(self, max_boot_time, login_prompt="ubuntu login:"):
+        """Streams the console during boot and returns True as soon as the login prompt shows up."""
+        self.is_root = False  # the root shell from the previous boot is gone
+        return (await self.expect([login_prompt], max_boot_time))[1] == "prompt"
+
+# What the tools print when they do not know the option of their machine-readable mode
+option_rejected = re.compile(r"invalid option|unrecognized option|is unknown|bad command line argument|^\s*usage:",
+                             flags=re.IGNORECASE | re.MULTILINE)
+
+async def query(session, name, timeout=10, **args):
+    """Runs a query from OutputParsers.PARSERS on the DUT and returns its parsed, typed result.
+
+    The machine-readable mode is tried first. If the DUT's tool rejects its option or its
+    output does not parse, the session uses the text mode for the rest of the iteration;
+    any other failure (a timeout, an absent interface) falls back for this call only.
+    """
+    parser = OutputParsers.PARSERS[name]
+    if name not in session.text_queries:
+        output, status = await session.run(parser.json_command.format(**args), timeout)
+        log_message(output)
+        rejected = status != 0 and bool(option_rejected.search(output))
+        if status == 0:
+            try:
+                return parser.parse_json(output)
+            except (ValueError, KeyError, TypeError, IndexError):
+                rejected = True
+        if rejected:
+            log_message(f"No JSON output for {name}, using the text output this iteration.", level=logging.WARNING)
+            session.text_queries.add(name)
+        else:
+            log_message(f"JSON query {name} failed (status {status}), trying the text output.", level=logging.WARNING)
+    output, _ = await session.run(parser.text_command.format(**args), timeout)
+    log_message(output)
+    try:
+        return parser.parse_text(output)
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        log_message(f"Could not parse the text output of {name}: {e}", level=logging.WARNING)
+        return parser.parse_text("")
 
 def extract_system_stats(output):
-    """Extracts CPU Usage, Temperature, and Memory Usage from console output."""
-    cpu_usage, temperature, memory_usage = "Not Found", "Not Found", "Not Found"
+    """Extracts CPU Usage (%), Temperature (°C), and Memory Usage (%) from console output, None if not found."""
+    cpu_usage, temperature, memory_usage = None, None, None
     output = output.replace("\r", "").replace("\n", "").replace(" ", " ")
     match = re.search(r"Usage of /:\s+([\d.]+%)", output)
     if match:
-        cpu_usage = match.group(1)
+        cpu_usage, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Temperature:\s+([\d.]+ C)", output)
     if match:
-        temperature = match.group(1)
+        temperature, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Memory usage:\s+([\d.]+%)", output)
     if match:
-        memory_usage = match.group(1)
+        memory_usage, _ = OutputParsers.parse_quantity(match.group(1))
     return cpu_usage, temperature, memory_usage
 
-free_headers = [
-    "before stress-ng mem total",
-    "before stress-ng mem used",
-    "before stress-ng mem free",
-    "before stress-ng mem shared",
-    "before stress-ng mem buff/cache",
-    "before stress-ng mem available",
-    "before stress-ng swap total",
-    "before stress-ng swap used",
-    "before stress-ng swap free",
-    "after stress-ng mem total",
-    "after stress-ng mem used",
-    "after stress-ng mem free",
-    "after stress-ng mem shared",
-    "after stress-ng mem buff/cache",
-    "after stress-ng mem available",
-    "after stress-ng swap total",
-    "after stress-ng swap used",
-    "after stress-ng swap free",
-]
-
-def parse_free_output_hardcoded(free_output, prefix):
-    """Parses the 'free -h' output with hardcoded logic."""
-    free_data = {}
+# free -h columns, "Mem:" row then "Swap:" row, in bytes
+free_fields = ["mem total", "mem used", "mem free", "mem shared", "mem buff/cache", "mem available",
+               "swap total", "swap used", "swap free"]
+
+def parse_free_output_hardcoded(free_output):
+    """Parses the 'free -h' output with hardcoded logic, returning the values in free_fields order
+    as bytes ("1.2Gi" -> 1288490188.8), None where missing."""
+    free_values = [None] * len(free_fields)
     lines = free_output.splitlines()
 
     for line in lines:
         parts = line.split()
         if len(parts) >= 7 and parts[0] == "Mem:":
-            free_data[f"{prefix} mem total"] = parts[1]
-            free_data[f"{prefix} mem used"] = parts[2]
-            free_data[f"{prefix} mem free"] = parts[3]
-            free_data[f"{prefix} mem shared"] = parts[4]
-            free_data[f"{prefix} mem buff/cache"] = parts[5]
-            free_data[f"{prefix} mem available"] = parts[6]
+            free_values[0:6] = [OutputParsers.parse_quantity(part)[0] for part in parts[1:7]]
         elif len(parts) >= 4 and parts[0] == "Swap:":
-            free_data[f"{prefix} swap total"] = parts[1]
-            free_data[f"{prefix} swap used"] = parts[2]
-            free_data[f"{prefix} swap free"] = parts[3]
+            free_values[6:9] = [OutputParsers.parse_quantity(part)[0] for part in parts[1:4]]
+
+    return free_values
+
+# mpstat -P ALL 1 1 columns per CPU
+mpstat_fields = ("usr", "nice", "sys", "iowait", "soft", "idle")
+
+class Snapshot:
+    """The sensors, free -h and mpstat readings of one phase of an iteration, e.g. "before stress-ng".
+
+    Readings sit in flat float arrays next to their names, with NaN for a missing reading:
+    sensors in their sensor_units, free -h in bytes in free_fields order and mpstat in % as
+    one mpstat_fields row per CPU.
+    """
+    __slots__ = ("phase", "sensor_names", "sensor_units", "sensors", "memory", "cpus", "mpstat")
+
+    def __init__(self, phase, sensor_names, sensor_units, sensors, memory, cpus, mpstat):
+        self.phase = phase
+        self.sensor_names = sensor_names
+        self.sensor_units = sensor_units
+        self.sensors = sensors
+        self.memory = memory
+        self.cpus = cpus
+        self.mpstat = mpstat
+
+    def sensor_columns(self):
+        return [(OutputParsers.with_unit(f"{self.phase} {name}", unit), None if math.isnan(value) else value)
+                for name, unit, value in zip(self.sensor_names, self.sensor_units, self.sensors)]
+
+    def free_columns(self):
+        return [(f"{self.phase} {field} (B)", None if math.isnan(value) else value)
+                for field, value in zip(free_fields, self.memory)]
+
+    def mpstat_columns(self):
+        return [(f"{self.phase} average CPU {cpu} %{field}", None if math.isnan(value) else value)
+                for (cpu, field), value in zip(((cpu, field) for cpu in self.cpus for field in mpstat_fields),
+                                               self.mpstat)]
+
+async def collect_snapshot(session, phase):
+    """Reads sensors, free -h and mpstat -P ALL 1 1 on the DUT into the Snapshot of a phase."""
+    log_message(f"Collecting sensor data ({phase})...")
+    with step_span(session, f"sensors {phase}"):
+        sensors = await query(session, "sensors")
+
+    log_message(f"Collecting memory usage details (free -h) ({phase})...")
+    with step_span(session, f"free {phase}"):
+        free_output, _ = await session.run("free -h", 10)
+    log_message(free_output)
 
-    return free_data
+    log_message(f"Collecting mpstat -P ALL 1 1 data ({phase})...")
+    with step_span(session, f"mpstat {phase}"):
+        mpstat = await query(session, "mpstat")
+
+    return Snapshot(phase, tuple(sensors), tuple(unit for _, unit in sensors.values()),
+                    array("d", (math.nan if value is None else value for value, _ in sensors.values())),
+                    array("d", (math.nan if value is None else value for value in parse_free_output_hardcoded(free_output))),
+                    tuple(mpstat), array("d", (math.nan if stats[field] is None else stats[field]
+                                               for stats in mpstat.values() for field in mpstat_fields)))
+
+def snapshot_columns(snapshots):
+    """Returns the (header, value) columns of the snapshots: sensors, then free, then sorted mpstat."""
+    return [column for snapshot in snapshots for column in snapshot.sensor_columns()] + \
+        [column for snapshot in snapshots for column in snapshot.free_columns()] + \
+        sorted(column for snapshot in snapshots for column in snapshot.mpstat_columns())
+
+# CPU frequencies and thermal zones, read with one `grep -H .` per telemetry sample
+thermal_paths = " ".join([f"/sys/devices/system/cpu/cpu*/cpufreq/{attribute}"
+                          for attribute in ("scaling_cur_freq", "base_frequency", "cpuinfo_max_freq")] +
+                         [f"/sys/class/thermal/thermal_zone*/{attribute}"
+                          for attribute in ("type", "temp", "trip_point_*_temp", "trip_point_*_type")])
+
+def parse_sysfs_thermal(sysfs_output):
+    """Parses `grep -H .` output of the thermal_paths files.
+
+    Returns {"freqs": {cpu: Hz}, "base_frequency": {cpu: Hz}, "cpuinfo_max_freq": {cpu: Hz},
+    "zones": {zone: {"type": str, "temp": °C or None, "trips": [(trip type, °C), ...]}}};
+    files that do not exist on the DUT are left out.
+    """
+    cpufreq = {"scaling_cur_freq": {}, "base_frequency": {}, "cpuinfo_max_freq": {}}
+    for match in re.finditer(r"^/sys/devices/system/cpu/cpu(\d+)/cpufreq/(\w+):\s*(\d+)\s*$", sysfs_output,
+                             flags=re.MULTILINE):
+        if match.group(2) in cpufreq:
+            cpufreq[match.group(2)][int(match.group(1))] = int(match.group(3)) * 1e3  # kHz
+    freqs = cpufreq["scaling_cur_freq"]
+    attributes = {}
+    for match in re.finditer(r"^/sys/class/thermal/(thermal_zone\d+)/(\w+):(.*)$", sysfs_output, flags=re.MULTILINE):
+        attributes.setdefault(match.group(1), {})[match.group(2)] = match.group(3).strip()
+    zones = {}
+    for zone, values in sorted(attributes.items()):
+        trips = []
+        for n in sorted(int(name.split("_")[2]) for name in values if re.fullmatch(r"trip_point_\d+_temp", name)):
+            trip_temp = values[f"trip_point_{n}_temp"]
+            if trip_temp.lstrip("-").isdigit():
+                trips.append((values.get(f"trip_point_{n}_type"), int(trip_temp) / 1000))  # m°C
+        temp = values.get("temp", "")
+        zones[zone] = {"type": values.get("type", zone), "temp": int(temp) / 1000 if temp.lstrip("-").isdigit() else None,
+                       "trips": trips}
+    return {"freqs": dict(sorted(freqs.items())), "base_frequency": cpufreq["base_frequency"],
+            "cpuinfo_max_freq": cpufreq["cpuinfo_max_freq"], "zones": zones}
+
+async def sample_telemetry(session, samples, interval, stop, paused):
+    """Appends (seconds since start, Snapshot, parse_sysfs_thermal state) to samples every interval
+    seconds until stop is set.
+
+    Runs as its own task next to the checks of the iteration; the session lock keeps its
+    commands from interleaving with theirs. Timed steps hold the paused lock, so no sample
+    queues in front of their commands and skews what they measure.
+    """
+    current_track.set(1)
+    start = time.monotonic()
+    while True:
+        async with paused:
+            elapsed = (time.monotonic() - start) / timeScale
+            snapshot = await collect_snapshot(session, f"stress-ng T+{elapsed:.0f}s")
+            with step_span(session, f"thermal stress-ng T+{elapsed:.0f}s"):
+                sysfs_output, _ = await session.run(f"grep -H . {thermal_paths}", 10)
+        samples.append((round(elapsed, 1), snapshot, parse_sysfs_thermal(sysfs_output)))
+        try:
+            await asyncio.wait_for(stop.wait(), interval * timeScale)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+def sample_temperature(snapshot):
+    """Hottest reading of the telemetryTemperature sensors, or None."""
+    readings = [value for name, unit, value in zip(snapshot.sensor_names, snapshot.sensor_units, snapshot.sensors)
+                if telemetryTemperature in name and unit == "°C" and not math.isnan(value)]
+    return max(readings) if readings else None
+
+def sample_cpu_busy(snapshot):
+    """Load of all CPUs (100 - %idle), or None."""
+    if "all" not in snapshot.cpus:
+        return None
+    row = snapshot.cpus.index("all")
+    idle = snapshot.mpstat[row * len(mpstat_fields) + mpstat_fields.index("idle")]
+    return None if math.isnan(idle) else round(100.0 - idle, 2)
+
+def sample_memory_used(snapshot):
+    """Used memory in bytes, or None."""
+    used = snapshot.memory[free_fields.index("mem used")]
+    return None if math.isnan(used) else used
+
+# Summarized telemetry series: (name, unit, value of one sample)
+telemetry_series = [("Temperature", "°C", sample_temperature), ("CPU Busy", "%", sample_cpu_busy),
+                    ("Memory Used", "B", sample_memory_used)]
+telemetry_columns = [f"Stress {name} {stat} ({unit})" for name, unit, _ in telemetry_series
+                     for stat in ("Min", "Max", "Mean", "P95")] + ["Stress Temperature Plateau (s)"]
+
+def time_to_plateau(times, values, tolerance):
+    """Seconds until the series settles: the first sample from which every later one stays within
+    tolerance of the final level (the mean of the last quarter). None with fewer than 3 samples.
+    """
+    if len(values) < 3:
+        return None
+    tail = values[-max(len(values) // 4, 1):]
+    level = sum(tail) / len(tail)
+    settled = len(values) - 1
+    while settled > 0 and abs(values[settled - 1] - level) <= tolerance:
+        settled -= 1
+    return times[settled]
+
+def telemetry_summary(samples):
+    """Returns the telemetry_columns values of the samples: min, max, mean and p95 of each series, then
+    the time to the temperature plateau. Columns without samples are None.
+    """
+    summary = []
+    for _, _, sample_value in telemetry_series:
+        values = [value for value in (sample_value(snapshot) for _, snapshot, _ in samples) if value is not None]
+        if not values:
+            summary.extend([None] * 4)
+            continue
+        ordered = sorted(values)
+        summary.extend([ordered[0], ordered[-1], round(sum(values) / len(values), 2),
+                        ordered[math.ceil(0.95 * len(ordered)) - 1]])
+    temperatures = [(elapsed, sample_temperature(snapshot)) for elapsed, snapshot, _ in samples]
+    temperatures = [(elapsed, value) for elapsed, value in temperatures if value is not None]
+    summary.append(time_to_plateau([elapsed for elapsed, _ in temperatures], [value for _, value in temperatures],
+                                   telemetryPlateauTolerance))
+    return summary
+
+throttle_columns = ["Throttled", "Throttled Cores", "Throttle Duration (s)", f"Max Frequency Drop vs {throttleReference} (%)",
+                    "Min Core Frequency (Hz)", "Peak Core Frequency (Hz)", "Trip Points Reached"]
+
+def throttle_summary(samples, threshold, reference):
+    """Returns the throttle_columns values of the samples.
+
+    A core counts as throttled in a sample when its frequency is threshold % or more below
+    its reference frequency (see throttleReference). A fixed reference shows a board held
+    back for the whole window as throttled and keeps iterations comparable; cores without
+    it fall back to cpuinfo_max_freq, then to the highest frequency they reached during the
+    samples. The throttle duration adds up the time from each sample with a throttled core
+    to the next one. Trip points are reported as "<zone type> <trip type>" when a zone
+    reached them (active, i.e. fan, trips aside).
+    """
+    freqs = [(elapsed, thermal["freqs"]) for elapsed, _, thermal in samples if thermal["freqs"]]
+    trips = sorted({f"{zone['type']} {trip_type}" for _, _, thermal in samples for zone in thermal["zones"].values()
+                    for trip_type, trip_temp in zone["trips"]
+                    if trip_type != "active" and zone["temp"] is not None and zone["temp"] >= trip_temp})
+    if not freqs:
+        return [None] * 6 + [", ".join(trips) or None]
+
+    peaks, limits = {}, {}
+    for _, sample in freqs:
+        for cpu, hz in sample.items():
+            peaks[cpu] = max(peaks.get(cpu, 0.0), hz)
+    fallbacks = {"base_frequency": ["base_frequency", "cpuinfo_max_freq"], "cpuinfo_max_freq": ["cpuinfo_max_freq"]}
+    for attribute in reversed(fallbacks.get(reference, [])):
+        for _, _, thermal in samples:
+            limits.update(thermal[attribute])
+    throttled, duration, max_drop = set(), 0.0, 0.0
+    for n, (elapsed, sample) in enumerate(freqs):
+        drops = {cpu: (1 - hz / (limits.get(cpu) or peaks[cpu])) * 100 for cpu, hz in sample.items()
+                 if limits.get(cpu) or peaks[cpu]}
+        cores = {cpu for cpu, drop in drops.items() if drop >= threshold}
+        if cores:
+            throttled |= cores
+            duration += (freqs[n + 1][0] if n + 1 < len(freqs) else elapsed + telemetryInterval) - elapsed
+        max_drop = max([max_drop] + list(drops.values()))
+    return ["Yes" if throttled else "No", len(throttled), round(duration, 1), round(max_drop, 1),
+            min(hz for _, sample in freqs for hz in sample.values()), max(peaks.values()), ", ".join(trips) or None]
 
 def send_rps_command(command):
     """Sends command to RPS and handles errors."""
@@ -153,6 +641,313 @@ def send_rps_command(command):
         log_message(f"RPS command '{command}' failed. Error: {e}", level=logging.ERROR)
         return False
         
+def parse_sysfs_links(sysfs_output):
+    """Parses `grep -H . /sys/class/net/<iface>/<attribute> ...` output into {iface: {attribute: value}}.
+
+    Attributes that cannot be read (carrier and speed of a link that is down) are missing.
+    """
+    links = {}
+    for match in re.finditer(r"^/sys/class/net/([^/\s]+)/(\w+):(.*)$", sysfs_output, flags=re.MULTILINE):
+        links.setdefault(match.group(1), {})[match.group(2)] = match.group(3).strip()
+    return links
+
+async def wait_for_links(session, interfaces, timeout, first_poll=0.1, max_poll=0.5):
+    """Waits for carrier on all interfaces, polling sysfs with exponential backoff.
+
+    Each poll reads operstate, carrier and speed of every interface still down in a
+    single console command, and the wait between polls doubles from first_poll up to
+    max_poll. An interface counts as up from the first poll that shows its carrier.
+    A dead link always waits out the timeout, so it is scaled by timeScale like the
+    fixed waits. Returns {iface: (link detected, speed in bit/s or None, seconds to link or None)}.
+    """
+    links = {iface: (False, None, None) for iface in interfaces}
+    pending = list(interfaces)
+    start = time.monotonic()
+    deadline = start + timeout * timeScale
+    poll_interval = first_poll
+    while True:
+        paths = " ".join(f"/sys/class/net/{iface}/{attribute}" for iface in pending
+                         for attribute in ("operstate", "carrier", "speed"))
+        sysfs_output, _ = await session.run(f"grep -H . {paths}", 10)
+        now = time.monotonic()
+        for iface, attributes in parse_sysfs_links(sysfs_output).items():
+            if iface in pending and attributes.get("carrier") == "1":
+                speed = attributes.get("speed", "")
+                # Speed from Mb/s to bit/s; negotiation time in DUT seconds, also when timeScale speeds up an emulated run
+                links[iface] = (True, int(speed) * 1e6 if speed.isdigit() else None,
+                                round((now - start) / timeScale, 2))
+        pending = [iface for iface in pending if not links[iface][0]]
+        if not pending or now >= deadline:
+            return links
+        await pause(poll_interval)
+        poll_interval = min(poll_interval * 2, max_poll)
+
+def plan_network_changes(addr_state, wanted):
+    """Returns the commands that give each interface in wanted ({iface: address or None}) its wanted state.
+
+    addr_state is the parsed `ip addr` state of the DUT: interfaces that are already
+    administratively up are not set up again and assigned addresses are not re-added.
+    """
+    changes = []
+    for iface, address in wanted.items():
+        entry = addr_state.get(iface, {})
+        if "UP" not in entry.get("flags", []):
+            changes.append(f"ip link set {iface} up")
+        if address and address not in [local for local, _ in entry.get("addresses", [])]:
+            changes.append(f"ip addr add {address}/24 dev {iface}")
+    return changes
+
+# Per-interface ping columns: sheet name and key in the parse_ping_stats() result
+ping_columns = [("Ping Transmitted", "transmitted"), ("Ping Received", "received"), ("Ping Loss (%)", "loss"),
+                ("RTT Min (ms)", "min"), ("RTT Avg (ms)", "avg"), ("RTT Max (ms)", "max"), ("RTT Mdev (ms)", "mdev")]
+
+def parse_ping_stats(ping_output):
+    """Parses the summary of one ping run.
+
+    Returns transmitted, received and loss (%) plus, if any reply came back, the
+    min/avg/max/mdev round-trip times in ms; None while the summary is missing.
+    """
+    summary = re.search(r"(\d+) packets transmitted, (\d+) received,.*?([\d.]+)% packet loss", ping_output)
+    if not summary:
+        return None
+    stats = {"transmitted": int(summary.group(1)), "received": int(summary.group(2)), "loss": float(summary.group(3))}
+    rtt = re.search(r"rtt min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms", ping_output)
+    if rtt:
+        stats.update(zip(("min", "avg", "max", "mdev"), map(float, rtt.groups())))
+    return stats
+
+async def ping_all(session, targets, count, interval):
+    """Pings the targets of all interfaces ({iface: target}) in the background at once.
+
+    Every ping writes its own log on the DUT. Once the pings should be done, a single
+    command reads all logs, repeated until every summary is in or 10 s more passed.
+    Returns {iface: stats} as parsed by parse_ping_stats().
+    """
+    logs = {iface: f"/tmp/ping_{iface}.log" for iface in targets}
+    await session.run(" ".join(f"ping -c {count} -i {interval} {target} > {logs[iface]} 2>&1 &"
+                                for iface, target in targets.items()), 15)
+    await pause(count * interval)
+    deadline = time.monotonic() + 10 * timeScale
+    while True:
+        ping_output, _ = await session.run("grep -H . " + " ".join(logs.values()), 15)
+        log_lines = {}
+        for match in re.finditer(r"^(/tmp/ping_\S+?\.log):(.*)$", ping_output, flags=re.MULTILINE):
+            log_lines.setdefault(match.group(1), []).append(match.group(2))
+        stats = {iface: parse_ping_stats("\n".join(log_lines.get(log, []))) for iface, log in logs.items()}
+        if all(stats.values()) or time.monotonic() >= deadline:
+            for iface, log in logs.items():
+                log_message(f"Ping output of {iface}:\n" + "\n".join(log_lines.get(log, [])))
+            return stats
+        await pause(1)
+
+# Per-interface throughput columns: sheet name and key in the parse_iperf_json() results
+throughput_columns = [("Throughput (Mbit/s)", "mbps"), ("TCP Retransmits", "retransmits"),
+                      ("UDP Jitter (ms)", "jitter"), ("UDP Loss (%)", "udp_loss")]
+
+async def throughput_all(session, tests, duration, udp_bandwidth):
+    """Runs a TCP and then a UDP iperf3 test on all interfaces at once ({iface: (local address, peer)}).
+
+    Every test binds to its interface's address and uses its own server port, and
+    writes its JSON report to its own file on the DUT, read back like the ping logs.
+    Returns {iface: results} merged from both tests as parsed by parse_iperf_json().
+    """
+    results = {iface: {} for iface in tests}
+    for protocol, options in (("tcp", ""), ("udp", f" -u -b {udp_bandwidth}")):
+        logs = {iface: f"/tmp/iperf_{protocol}_{iface}.json" for iface in tests}
+        await session.run(" ".join(f"iperf3 -c {peer} -B {local} -p {5201 + n} -t {duration}{options} -J "
+                                   f"> {logs[iface]} 2>&1 &" for n, (iface, (local, peer)) in enumerate(tests.items())), 15)
+        await pause(duration)
+        deadline = time.monotonic() + 10 * timeScale
+        while True:
+            output, _ = await session.run("grep -H . " + " ".join(logs.values()), 15)
+            log_lines = {}
+            for match in re.finditer(r"^(/tmp/iperf_\S+?\.json):(.*)$", output, flags=re.MULTILINE):
+                log_lines.setdefault(match.group(1), []).append(match.group(2))
+            parsed = {}
+            for iface, log in logs.items():
+                try:
+                    parsed[iface] = OutputParsers.parse_iperf_json("\n".join(log_lines.get(log, [])))
+                except (ValueError, KeyError, TypeError):
+                    parsed[iface] = None  # report still being written
+            if all(parsed.values()) or time.monotonic() >= deadline:
+                break
+            await pause(1)
+        for iface, result in parsed.items():
+            log_message(f"iperf3 {protocol.upper()} result of {iface}: {result}")
+            results[iface].update(result or {"error": "no report"})
+    return results
+
+async def collect_inventory(session):
+    """Reads the hardware of the DUT once: lsusb, lsblk and ip link.
+
+    Returns {"usb": {"vendor:product": [description, ...]}, "block": {name: {...}},
+    "interfaces": {ifname: {...}}} for match_hardware() lookups.
+    """
+    usb_output, _ = await session.run("lsusb", 10)
+    log_message(usb_output)
+    usb = {}
+    for device in OutputParsers.parse_lsusb(usb_output):
+        usb.setdefault(device["id"], []).append(device["description"])
+    return {"usb": usb, "block": await query(session, "lsblk"), "interfaces": await query(session, "ip_link")}
+
+def match_hardware(inventory, rule):
+    """Returns how many devices of the inventory match a rule from hardwareRules."""
+    found = 0
+    for usb_id in rule.get("usb", []):
+        vendor, _, product = usb_id.lower().partition(":")
+        found += sum(len(descriptions) for device_id, descriptions in inventory["usb"].items()
+                     if device_id == usb_id.lower() or (product == "*" and device_id.startswith(vendor + ":")))
+    found += sum(name in inventory["block"] for name in rule.get("block", []))
+    found += sum(name in inventory["interfaces"] for name in rule.get("interfaces", []))
+    return found
+
+async def modem_snapshot(session, snapshots, modem):
+    """Returns the parsed `mmcli -K -m N` properties of a modem, read at most once per iteration.
+
+    snapshots is the cache of the iteration; drop a modem from it after --simple-connect
+    so its next snapshot shows the new state.
+    """
+    if modem not in snapshots:
+        output, _ = await session.run(f"mmcli -K -m {modem}", 10)
+        log_message(output)
+        snapshots[modem] = OutputParsers.parse_mmcli_keyvalue(output)
+    return snapshots[modem]
+
+async def connect_modems(session, snapshots, apns, attempts=3, timeout=30):
+    """Connects all modems ({modem: apn}) at once, each --simple-connect running in the background on the DUT.
+
+    Every attempt writes its own log, which stays empty until mmcli is done, so a timed-out
+    connect still running cannot write into the log of its retry. The logs are polled
+    together and each modem's result is taken from its refreshed snapshot as soon as its
+    log fills; a failed modem is retried 3 s later while the others go on.
+    Returns {modem: "Connected Successfully" or "Connection Failed"}.
+    """
+    logs = {}
+    statuses, tries, running = {}, dict.fromkeys(apns, 0), {}  # running: modem -> deadline of its attempt
+    start_at = dict.fromkeys(apns, time.monotonic())
+    while len(statuses) < len(apns):
+        due = [modem for modem in apns if modem not in statuses and modem not in running
+               and time.monotonic() >= start_at[modem]]
+        if due:
+            for modem in due:
+                tries[modem] += 1
+                logs[modem] = f"/tmp/modem_{modem}_connect_{tries[modem]}.log"
+            await session.run(" ".join(f"mmcli -m {modem} --simple-connect=\"apn={apns[modem]}\" > {logs[modem]} 2>&1 &"
+                                       for modem in due), 15)
+            for modem in due:
+                running[modem] = time.monotonic() + timeout * timeScale
+        await pause(0.5)
+        if not running:
+            continue
+        output, _ = await session.run("grep -H . " + " ".join(logs[modem] for modem in running), 15)
+        finished = {}
+        for match in re.finditer(r"^/tmp/modem_(\d+)_connect_(\d+)\.log:(.*)$", output, flags=re.MULTILINE):
+            if int(match.group(2)) == tries[int(match.group(1))]:
+                finished.setdefault(int(match.group(1)), []).append(match.group(3))
+        for modem in list(running):
+            if modem not in finished and time.monotonic() < running[modem]:
+                continue
+            del running[modem]
+            log_message(f"Modem {modem + 1} connect attempt {tries[modem]}: " +
+                        "\n".join(finished.get(modem, ["no result within the timeout"])))
+            snapshots.pop(modem, None)
+            snapshot = await modem_snapshot(session, snapshots, modem)
+            if snapshot.get("modem.generic.state") == "connected":
+                statuses[modem] = "Connected Successfully"
+            elif tries[modem] >= attempts:
+                statuses[modem] = "Connection Failed"
+            else:
+                start_at[modem] = time.monotonic() + 3 * timeScale
+    return statuses
+
+def assign_modem_columns(snapshots, columns, devices):
+    """Returns the modem of each of the columns (None where there is none) and the modems left over.
+
+    ModemManager numbers only the modems that enumerated, so the index alone would move a
+    module into the columns of a missing one. With devices, a modem goes to the column of
+    the device it sits on (its full `modem.generic.device` path or the last part of it,
+    such as the USB port "1-3"); without, the modems fill the columns in device path order.
+    """
+    assigned, surplus = [None] * columns, []
+    for modem in sorted(snapshots, key=lambda modem: snapshots[modem].get("modem.generic.device") or ""):
+        device = snapshots[modem].get("modem.generic.device") or ""
+        if devices:
+            column = next((n for n, wanted in enumerate(devices[:columns])
+                           if device == wanted or device.endswith("/" + wanted)), None)
+        else:
+            column = next((n for n in range(columns) if assigned[n] is None), None)
+        if column is None or assigned[column] is not None:
+            surplus.append(modem)
+        else:
+            assigned[column] = modem
+    return assigned, surplus
+
+def sim_slot_status(snapshot):
+    """Returns the active SIM slot ("Slot N" or "Unknown") and the SIM status of a modem snapshot."""
+    slots = snapshot.get("modem.generic.sim-slots") or []
+    primary = snapshot.get("modem.generic.primary-sim-slot")
+    if primary and primary.isdigit() and int(primary) <= len(slots):
+        sim = slots[int(primary) - 1]
+        return f"Slot {primary}", "SIM Active" if sim else "SIM Not Detected"
+    # ModemManager without multi-SIM support only reports the SIM in use
+    return "Unknown", "SIM Active" if snapshot.get("modem.generic.sim") else "SIM Not Detected"
+
+async def pause(seconds):
+    """Waits a fixed test duration (power hold, settle time), scaled by timeScale."""
+    await asyncio.sleep(seconds * timeScale)
+
+# Step spans of the iteration the current task is running, and the trace track they go to
+current_spans = contextvars.ContextVar("current_spans", default=None)
+current_track = contextvars.ContextVar("current_track", default=0)  # 1 for the telemetry sampler
+# Background tasks of the iteration the current task is running, cancelled if it ends early
+current_tasks = contextvars.ContextVar("current_tasks", default=None)
+
+@contextmanager
+def step_span(session, name, **args):
+    """Records one step of the iteration as a timing span.
+
+    The span keeps the step's start and end, the console bytes its track read meanwhile
+    and why those reads ended: "error" if the step raised or lost the port, else
+    "timeout" if any read timed out, else "prompt" ("none" for steps without reads).
+    """
+    spans = current_spans.get()
+    track = current_track.get()
+    reads_before = session.read_reasons[track].copy()
+    bytes_before = session.bytes_read[track]
+    start = time.time()
+    reason = None
+    try:
+        yield
+    except Exception:
+        reason = "error"
+        raise
+    finally:
+        reads = session.read_reasons[track] - reads_before
+        reason = reason or next((r for r in ("error", "timeout", "prompt") if reads[r]), "none")
+        if spans is not None:
+            spans.append({"name": name, "start": start, "end": time.time(), "track": track,
+                          "bytes": session.bytes_read[track] - bytes_before, "reason": reason, "args": args})
+
+def write_trace(dut, ite, spans):
+    """Writes the spans of one iteration as a Chrome trace (chrome://tracing or Perfetto) and logs the slowest steps."""
+    pid = duts.index(dut) + 1
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": dut["id"]}},
+              {"name": "thread_name", "ph": "M", "pid": pid, "tid": 1, "args": {"name": "telemetry"}}]
+    for span in spans:
+        events.append({"name": span["name"], "cat": "step", "ph": "X", "pid": pid, "tid": span["track"],
+                       "ts": int(span["start"] * 1e6), "dur": int((span["end"] - span["start"]) * 1e6),
+                       "args": {"bytes": span["bytes"], "reason": span["reason"], **span["args"]}})
+    trace_file = os.path.join(traceDir, f"{dut['id']}_iteration{ite}.json")
+    try:
+        os.makedirs(traceDir, exist_ok=True)
+        with open(trace_file, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    except OSError as e:
+        log_message(f"Error writing trace {trace_file}: {e}", level=logging.ERROR)
+
+    slowest = sorted(spans, key=lambda span: span["end"] - span["start"], reverse=True)[:5]
+    log_message("Slowest steps: " + ", ".join(f"{span['name']} {span['end'] - span['start']:.1f}s" for span in slowest))
+
 def get_random_sum_parts(total=40, count=5):
     if count > total:
         raise ValueError("Count cannot be greater than the total sum.")
@@ -167,53 +962,113 @@ if os.path.exists(excelFile):
     os.remove(excelFile)  # Delete old file
 
 wb = openpyxl.Workbook()
-ws = wb.active
 
 # Start with a minimal header (interfaces will be added later)
-header = ["Iteration", "Timestamp", "CPU Usage", "CPU Temperature", "Memory Usage", "Power Cycle Status", "USB Status", "GPS Status"]
-header_extend = ["LTE1 Status", "LTE2 Status", "SIM1 Status", "SIM2 Status", "Modem1 Connection Status",
-                 "Modem2 Connection Status", "SIM1 Operator Name", "SIM2 Operator Name", "SIM1 Registration",
-                 "SIM2 Registration"]
-for iface in interfaces:
-    header_extend.extend([f"{iface} Ethernet Detected", f"{iface} Speed", f"{iface} Ping Result"])
-
-sensor_headers = []
-free_headers = []
-mpstat_headers = set()
-
-header_full = header + header_extend + sensor_headers + free_headers + list(mpstat_headers)
-
-ws.append(header_full)
+header = ["Iteration", "Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "Memory Usage (%)", "Power Cycle Status", "USB Status", "GPS Status"]
 
 # DYNAMIC COLUMN WIDTH ADJUSTMENT and HEADER FORMATTING
 header_font = Font(bold=True)
 header_alignment = Alignment(horizontal='center', vertical='center')
 
-# Adjust column width and apply header formatting for ALL headers
-for col_num, header_item in enumerate(header_full, 1):
-    column_letter = get_column_letter(col_num)
-    max_length = len(header_item)  # Start with header length
-
-    # Check data in the column for longer values
-    for row in ws.iter_rows(min_row=2):
-        cell_value = row[col_num - 1].value
-        if cell_value and len(str(cell_value)) > max_length:
-            max_length = len(str(cell_value))
-
-    # Add some padding
-    ws.column_dimensions[column_letter].width = max_length + 5
-
-    # Apply Header formatting
-    cell = ws.cell(row=1, column=col_num)
-    cell.font = header_font
-    cell.alignment = header_alignment
-
 # Cell alignment for data rows
 data_alignment = Alignment(horizontal='center', vertical='center')
 
-# Run for multiple iterations
-for ite in range(1, iteration + 1):
-    log_message(f"\n========== Iteration {ite} ==========\n")
+def dut_header(dut):
+    """Returns the fixed columns of a DUT sheet; sensor, free and mpstat columns follow per iteration."""
+    modems = range(1, dut["modemColumns"] + 1)
+    header_extend = [f"LTE{n} Status" for n in modems] + [f"SIM{n} Status" for n in modems] + \
+        [f"Modem{n} Connection Status" for n in modems] + [f"SIM{n} Operator Name" for n in modems] + \
+        [f"SIM{n} Registration" for n in modems]
+    for iface in dut["interfaces"]:
+        header_extend.extend([f"{iface} Ethernet Detected", f"{iface} Speed (bit/s)", f"{iface} Ping Result",
+                              f"{iface} Time to Link (s)"])
+        header_extend.extend(f"{iface} {name}" for name, _ in ping_columns)
+        if dut["throughputPeers"]:
+            header_extend.extend(f"{iface} {name}" for name, _ in throughput_columns)
+    return header + header_extend + telemetry_columns + throttle_columns
+
+def format_header(ws, header_full):
+    """Writes the header row, widens its columns to fit the header and applies header formatting.
+
+    Data rows widen the columns as they are added (append_row), so no row is scanned here.
+    """
+    known = sum(1 for cell in ws[1] if cell.value is not None)  # columns already sized
+    for col_num, header_item in enumerate(header_full, 1):
+        cell = ws.cell(row=1, column=col_num, value=header_item)
+        dimension = ws.column_dimensions[get_column_letter(col_num)]
+        width = len(header_item) + 5  # Add some padding
+        dimension.width = max(dimension.width, width) if col_num <= known else width
+        cell.font = header_font
+        cell.alignment = header_alignment
+
+def append_row(ws, row_data, alignment=None):
+    """Appends a data row and widens the columns its values do not fit in."""
+    ws.append(row_data)
+    for col_num, value in enumerate(row_data, 1):
+        if value and len(str(value)) + 5 > ws.column_dimensions[get_column_letter(col_num)].width:
+            ws.column_dimensions[get_column_letter(col_num)].width = len(str(value)) + 5
+        if alignment is not None:
+            ws.cell(row=ws.max_row, column=col_num).alignment = alignment
+
+# Serializes the workbook: rows are added and the file is saved by one DUT at a time
+wb_lock = asyncio.Lock()
+
+async def store_results(dut, ite, header_full, row_data, samples):
+    """Appends one iteration row to the DUT's sheet, its telemetry samples to the DUT's
+    telemetry sheet, and saves the workbook.
+
+    The save runs in a worker thread, so the other DUTs' steps go on meanwhile; wb_lock
+    keeps them from changing the workbook while it is written.
+    """
+    async with wb_lock:
+        add_results(dut, ite, header_full, row_data, samples)
+        try:
+            await asyncio.to_thread(wb.save, excelFile)
+            log_message(f"Results saved to {excelFile} after iteration {ite}")
+        except Exception as e:
+            log_message(f"Error saving Excel file after iteration {ite}: {e}", level=logging.ERROR)
+
+def add_results(dut, ite, header_full, row_data, samples):
+    """Adds the rows of store_results to the workbook."""
+    ws = wb[dut["id"]]
+    format_header(ws, header_full)
+    append_row(ws, row_data, data_alignment)
+
+    # Time series: one row per sample, "Iteration", "Elapsed (s)", the sample's metrics without the phase,
+    # then the CPU frequencies and thermal zone temperatures. Values go to the column of their name; names
+    # not in the header yet (another sensor, CPU or zone) are added to its end.
+    telemetry_sheet = f"{dut['id']} telemetry"
+    if samples and telemetry_sheet not in wb.sheetnames:
+        wb.create_sheet(telemetry_sheet)
+    for elapsed, snapshot, thermal in samples:
+        columns = [("Iteration", ite), ("Elapsed (s)", elapsed)]
+        columns += [(name[len(snapshot.phase) + 1:], value) for name, value in snapshot_columns([snapshot])]
+        columns += [(f"CPU {cpu} Frequency (Hz)", hz) for cpu, hz in thermal["freqs"].items()]
+        columns += [(f"{zone} {values['type']} (°C)", values["temp"]) for zone, values in thermal["zones"].items()]
+        ts = wb[telemetry_sheet]
+        telemetry_header = [cell.value for cell in ts[1] if cell.value is not None]
+        new_names = [name for name, _ in columns if name not in telemetry_header]
+        if new_names:
+            telemetry_header += new_names
+            format_header(ts, telemetry_header)
+        row = [None] * len(telemetry_header)
+        for name, value in columns:
+            row[telemetry_header.index(name)] = value
+        append_row(ts, row)
+
+# Results store: one sheet per DUT, keyed by DUT ID
+for dut_num, dut in enumerate(duts):
+    ws = wb.active if dut_num == 0 else wb.create_sheet()
+    ws.title = dut["id"]
+    format_header(ws, dut_header(dut))
+
+async def run_iteration(dut, session, ite):
+    """Power cycles one DUT and runs every check on it.
+
+    Returns the sheet header and row for the iteration, or None if it had to be skipped.
+    """
+    interfaces = dut["interfaces"]
+    ip_addresses = dut["ipAddresses"]
 
     power_cycle_status = "Success"  # Initialize as success, will change if any reboot fails
     result = get_random_sum_parts(40, 5)
@@ -222,562 +1077,344 @@ for ite in range(1, iteration + 1):
     for reboot_num in range(1, rebootCount + 1):
         log_message(f"\n========== Reboot {reboot_num}/{rebootCount} ==========\n")
 
-        # Determine on and off durations for this iteration
-        on_duration = reboot_num
+        with step_span(session, "power cycle", reboot=reboot_num):
+            # Determine on and off durations for this iteration
+            on_duration = reboot_num
 
-        # Turn OFF the port
-        log_message(f"Turning OFF the port (Reboot {reboot_num})...")
-        if not send_rps_command("3 false"):
-            power_cycle_status = "Failed"  # Update status if any reboot fails
+            # Turn OFF the port
+            log_message(f"Turning OFF the port (Reboot {reboot_num})...")
+            if not await asyncio.to_thread(send_rps_command, f"{dut['outlet']} false"):
+                power_cycle_status = "Failed"  # Update status if any reboot fails
 
-        time.sleep(result[reboot_num])
+            await pause(result[reboot_num - 1])
 
-        # Turn ON the port
-        log_message(f"Turning ON the port (Reboot {reboot_num})...")
-        if not send_rps_command("3 true"):
-            power_cycle_status = "Failed"  # Update status if any reboot fails
+            # Turn ON the port
+            log_message(f"Turning ON the port (Reboot {reboot_num})...")
+            if not await asyncio.to_thread(send_rps_command, f"{dut['outlet']} true"):
+                power_cycle_status = "Failed"  # Update status if any reboot fails
 
-        time.sleep(on_duration)
+            if reboot_num < rebootCount:
+                await pause(on_duration)
 
     log_message("Reboot cycle completed.")
 
-    log_message("Waiting for 240 seconds for device reboot...")
-    time.sleep(240)
-
-    # Establish serial connection
-    log_message("Re-establishing serial connection...")
-    try:
-        ser = serial.Serial(serialDevice, baudRate, timeout=1)
-        time.sleep(2)
-    except serial.SerialException as e:
-        log_message(f"Error opening serial port: {e}", level=logging.ERROR)
-        continue
-
-    # Ensure login prompt
-    log_message("Checking for 'ubuntu login:' prompt...")
-    ser.write(b"\n" * 5)
-    output = read_serial_output(ser, 30, remove_extra_shell=False)
-    if "ubuntu login:" not in output:
-        log_message("[ERROR] 'ubuntu login:' not detected, skipping this iteration.", level=logging.ERROR)
-        continue
-
-    # Enter credentials
-    log_message("Logging in...")
-    ser.write(f"{username}\n".encode())
-    output = read_serial_output(ser, 10, remove_extra_shell=False)
-    if "Password:" not in output:
-        log_message("[ERROR] Password prompt not detected, skipping this iteration.", level=logging.ERROR)
-        continue
-    ser.write(f"{password}\n".encode())
-    output = read_serial_output(ser, 10)
-
-    # Check for login prompt
-    if "root@ubuntu:" not in output and "ubuntu@ubuntu:" not in output:
-        log_message("[ERROR] Login failed, skipping this iteration.", level=logging.ERROR)
-        continue
+    # The console session stays open across power cycles, so the whole boot is streamed
+    log_message(f"Waiting up to {maxBootTime} seconds for device reboot...")
+    with step_span(session, "boot wait"):
+        boot_start = time.monotonic()
+        session.discard()
+        if await session.wait_for_boot(maxBootTime):
+            log_message(f"Device booted in {time.monotonic() - boot_start:.1f} seconds.")
+        else:
+            log_message(f"'ubuntu login:' not seen within {maxBootTime} seconds of power on.", level=logging.WARNING)
+
+    with step_span(session, "login"):
+        # Ensure login prompt
+        log_message("Checking for 'ubuntu login:' prompt...")
+        await session.send("\n" * 5, newline=False)
+        output, reason = await session.expect(["ubuntu login:"], 30)
+        if reason != "prompt":
+            log_message(f"[ERROR] 'ubuntu login:' not detected (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
+            return None
+
+        # Enter credentials
+        log_message("Logging in...")
+        await session.send(dut["username"])
+        output, reason = await session.expect(["Password:"], 10)
+        if reason != "prompt":
+            log_message(f"[ERROR] Password prompt not detected (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
+            return None
+        await session.send(dut["password"])
+        output, reason = await session.expect(["root@ubuntu:", "ubuntu@ubuntu:"], 10)
+
+        # Check for login prompt
+        if reason != "prompt":
+            log_message(f"[ERROR] Login failed (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
+            return None
 
     # Extract system stats
     cpu_usage, temperature, memory_usage = extract_system_stats(output)
     log_message(f"CPU Usage: {cpu_usage}, CPU Temperature: {temperature}, Memory Usage: {memory_usage}")
 
-    ser.write("sudo su\n".encode())
-    time.sleep(2)
-    ser.write(f"{password}\n".encode())
-    time.sleep(2)
-
-    # Clear the sensor data before each iteration.
-    sensors_data = {}
-    free_data = {}
-    mpstat_data = {}
-
-    sensor_headers = []
-    free_headers = []
-    mpstat_headers = OrderedDict()
-
-    # Sensor data collection (before stress-ng)
-    log_message("Collecting sensor data (before stress-ng)...")
-    ser.write(b"sensors\n")
-    sensors_output = read_serial_output(ser, 10)
-    log_message(sensors_output)
-
-    lines = sensors_output.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensor_name = parts[0].strip()
-            sensor_value = parts[1].split("(")[0].strip()
-
-            full_sensor_name = sensor_name
-            adapter_info = None
-
-            # Scan backward to find adapter information
-            for j in range(i - 1, -1, -1):
-                if "Adapter:" in lines[j]:
-                    adapter_info = lines[j - 1].strip() + " " + lines[j].split(":")[1].strip()
-                    break
-
-            if adapter_info:
-                full_sensor_name = "before stress-ng " + adapter_info + " " + sensor_name
-            elif "Core" in sensor_name:
-                full_sensor_name = "before stress-ng " + sensor_name
-            else:
-                full_sensor_name = "before stress-ng " + sensor_name
-
-            # Check for existing detailed header before adding simpler one
-            if adapter_info or "Core" in sensor_name:
-                sensors_data[full_sensor_name] = sensor_value
-            elif full_sensor_name not in [key for key in sensors_data.keys() if "Adapter:" in key or "Core" in key]:
-                sensors_data[full_sensor_name] = sensor_value
-
-        i += 1
-
-    # Memory usage details (free -h) (before stress-ng)
-    log_message("Collecting memory usage details (free -h) (before stress-ng)...")
-    command = f"echo {password} | sudo -S free -h"
-    ser.write(f"{command}\n".encode())
-    free_output = read_serial_output(ser, 10, command_sent=command)
-    log_message(free_output)
+    # Get a root shell once, so no later step needs sudo
+    with step_span(session, "root shell"):
+        root_shell = await session.become_root(dut["password"])
+    if not root_shell:
+        log_message("[ERROR] Could not get a root shell, skipping this iteration.", level=logging.ERROR)
+        return None
 
-    free_data.update(parse_free_output_hardcoded(free_output, "before stress-ng"))
-
-    # mpstat -P ALL 1 1 (before stress-ng)
-    log_message("Collecting mpstat -P ALL 1 1 data (before stress-ng)...")
-    ser.write(b"mpstat -P ALL 1 1\n")
-    mpstat_output = read_serial_output(ser, 10)
-    log_message(mpstat_output)
-
-    mpstat_lines = mpstat_output.splitlines()
-    for line in mpstat_lines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":
-                cpu_name = parts[1]
-                mpstat_details = {
-                    f"before stress-ng average CPU {cpu_name} %usr": parts[2],
-                    f"before stress-ng average CPU {cpu_name} %nice": parts[3],
-                    f"before stress-ng average CPU {cpu_name} %sys": parts[4],
-                    f"before stress-ng average CPU {cpu_name} %iowait": parts[5],
-                    f"before stress-ng average CPU {cpu_name} %soft": parts[7],
-                    f"before stress-ng average CPU {cpu_name} %idle": parts[11],
-                }
-                mpstat_data.update(mpstat_details)
-                mpstat_headers.update(mpstat_details)
+    # Metrics before the load; any further phase is captured the same way
+    snapshots = [await collect_snapshot(session, "before stress-ng")]
 
     # stress-ng commands
     log_message("Starting stress-ng commands...")
-    ser.write(b"nohup stress-ng --vm $(nproc) --vm-bytes 100% --timeout 14m &\n")
-    time.sleep(2)  # give time for command to start.
-    ser.write(b"nohup stress-ng --cpu $(nproc) --timeout 14m &\n")
-    time.sleep(5)  # give time for command to start.
-    log_message("stress-ng commands started.")
-
-    # Sensor data collection (after stress-ng)
-    log_message("Collecting sensor data (after stress-ng)...")
-    ser.write(b"sensors\n")
-    sensors_output = read_serial_output(ser, 10)
-    log_message(sensors_output)
-
-    lines = sensors_output.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensor_name = parts[0].strip()
-            sensor_value = parts[1].split("(")[0].strip()
-
-            full_sensor_name = sensor_name
-            adapter_info = None
-
-            # Scan backward to find adapter information
-            for j in range(i - 1, -1, -1):
-                if "Adapter:" in lines[j]:
-                    adapter_info = lines[j - 1].strip() + " " + lines[j].split(":")[1].strip()
-                    break
-
-            if adapter_info:
-                full_sensor_name = "after stress-ng " + adapter_info + " " + sensor_name
-            elif "Core" in sensor_name:
-                full_sensor_name = "after stress-ng " + sensor_name
-            else:
-                full_sensor_name = "after stress-ng " + sensor_name
-
-            # Check for existing detailed header before adding simpler one
-            if adapter_info or "Core" in sensor_name:
-                sensors_data[full_sensor_name] = sensor_value
-            elif full_sensor_name not in [key for key in sensors_data.keys() if "Adapter:" in key or "Core" in key]:
-                sensors_data[full_sensor_name] = sensor_value
-
-        i += 1
-
-    # Memory usage details (free -h) (after stress-ng)
-    log_message("Collecting memory usage details (free -h) (after stress-ng)...")
-    command = f"echo {password} | sudo -S free -h"
-    ser.write(f"{command}\n".encode())
-    free_output = read_serial_output(ser, 10, command_sent=command)
-    log_message(free_output)
-
-    free_data.update(parse_free_output_hardcoded(free_output, "after stress-ng"))
-
-    # mpstat -P ALL 1 1 (after stress-ng)
-    log_message("Collecting mpstat -P ALL 1 1 data (after stress-ng)...")
-    ser.write(b"mpstat -P ALL 1 1\n")
-    mpstat_output = read_serial_output(ser, 10)
-    log_message(mpstat_output)
-
-    mpstat_lines = mpstat_output.splitlines()
-    for line in mpstat_lines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":
-                cpu_name = parts[1]
-                mpstat_details = {
-                    f"after stress-ng average CPU {cpu_name} %usr": parts[2],
-                    f"after stress-ng average CPU {cpu_name} %nice": parts[3],
-                    f"after stress-ng average CPU {cpu_name} %sys": parts[4],
-                    f"after stress-ng average CPU {cpu_name} %iowait": parts[5],
-                    f"after stress-ng average CPU {cpu_name} %soft": parts[7],
-                    f"after stress-ng average CPU {cpu_name} %idle": parts[11],
-                }
-                mpstat_data.update(mpstat_details)
-                mpstat_headers.update(mpstat_details)
-
-    # Update sensor headers and data
-    sensor_headers = list(sensors_data.keys())
-    free_headers = list(free_data.keys())
-    mpstat_headers = list(mpstat_headers.keys()) #convert back to list to keep it consistent
-    mpstat_headers.sort()
-
-    header_full = header + header_extend + sensor_headers + free_headers + mpstat_headers
-
-    # Update header in excel
-    for col_num, header_item in enumerate(header_full, 1):
-        ws.cell(row=1, column=col_num, value=header_item)
-
-    # After the headers are added, re-apply formatting and column width adjustments.
-    for col_num, header_item in enumerate(header_full, 1):
-        column_letter = get_column_letter(col_num)
-        max_length = len(header_item)
-
-        for row in ws.iter_rows(min_row=2):
-            cell_value = row[col_num - 1].value
-            if cell_value and len(str(cell_value)) > max_length:
-                max_length = len(str(cell_value))
-
-        ws.column_dimensions[column_letter].width = max_length + 5
-
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.alignment = header_alignment
+    with step_span(session, "stress-ng start"):
+        await session.run("nohup stress-ng --vm $(nproc) --vm-bytes 100% --timeout 14m &")
+        await session.run("nohup stress-ng --cpu $(nproc) --timeout 14m &")
+        log_message("stress-ng commands started.")
+        # Telemetry of the whole stress window, sampled alongside the checks below except the timed ones
+        stress_start = time.monotonic()
+        samples, stop_sampling, sampling_paused = [], asyncio.Event(), asyncio.Lock()
+        sampler = asyncio.create_task(sample_telemetry(session, samples, telemetryInterval, stop_sampling,
+                                                       sampling_paused))
+        current_tasks.get().append(sampler)
+        await pause(5)  # let the load ramp up before the after stress-ng snapshot
+
+    snapshots.append(await collect_snapshot(session, "after stress-ng"))
 
     # eMMC command
     log_message("Starting eMMC command...")
-    ser.write(b"./eMMC_aggressive_3mins.sh &\n")
-    time.sleep(60)  # give time for command to start.
+    with step_span(session, "eMMC start"):
+        await session.run("./eMMC_aggressive_3mins.sh &")
 
-    # Configure network interfaces
+    # Configure network interfaces: apply only what the DUT is missing, then poll every link together.
+    # Interfaces still down are retried, as long as their configuration still needs changes.
     log_message("Configuring Network Interfaces...")
-
-    # Configure network interfaces with retry mechanism
-    interface_results = {}
+    wanted = {iface: ip_addresses[i] if i < len(ip_addresses) else None for i, iface in enumerate(interfaces)}
+    links = {}
+    pending = list(interfaces)
+    for attempt in range(1, 4):
+        async with sampling_paused:
+            with step_span(session, "network bring-up", attempt=attempt):
+                addr_state = await query(session, "ip_addr")
+                changes = plan_network_changes(addr_state, {iface: wanted[iface] for iface in pending})
+                log_message(f"Network attempt {attempt}: {len(changes)} change(s) needed for {len(pending)} interface(s)")
+                if changes:
+                    for change in changes:
+                        log_message(f"Applying: {change}")
+                    await session.run("; ".join(changes), 30)
+        if attempt > 1 and not changes:
+            break  # configured as wanted, the remaining links are just down
+
+        log_message(f"Waiting up to {linkTimeout} seconds for the links of {len(pending)} interface(s)...")
+        async with sampling_paused:
+            with step_span(session, "link wait", attempt=attempt):
+                links.update(await wait_for_links(session, pending, linkTimeout))
+        pending = [iface for iface in pending if not links[iface][0]]
+        if not pending:
+            break
+
+    ping_targets = {}
     for i, iface in enumerate(interfaces):
-        log_message(f"Attempting to bring up interface {iface}...")
-        for retry in range(3):
-            ser.write(f"echo {password} | sudo -S ip link set {iface} up\n".encode())
-            time.sleep(5)  # Increased sleep time
-
-            if i < len(ipAddresses):
-                log_message(f"Assigning IP {ipAddresses[i]} to {iface}...")
-                ser.write(f"echo {password} | sudo -S ip addr add {ipAddresses[i]}/24 dev {iface}\n".encode())
-                time.sleep(5)  # Increased sleep time
-
-            log_message(f"Checking operational state of {iface} (attempt {retry + 1})...")
-            ser.write(f"echo {password} | sudo -S ethtool {iface}\n".encode())
-            time.sleep(5)  # Increased sleep time
-
-            ethtool_output = read_serial_output(ser, 5)
-
-            link_detected_match = re.search(r"Link detected: yes", ethtool_output)
-            speed_match = re.search(r"Speed:\s*(\d+)Mb/s", ethtool_output)
-
-            link_status = "Yes" if link_detected_match else "No"
-            speed = speed_match.group(0) if speed_match else "Unknown"
-
-            log_message(f"Interface {iface} - Link Detected: {link_status}, Speed: {speed}")
-
-            if link_detected_match:
-                if retry > 0:
-                    log_message(f"Interface {iface} came up after {retry+1} retries in iteration {ite}")
-                break  # Interface came up, break retry loop
-            elif retry == 2:  # All retries failed
-                log_message(f"Interface {iface} failed to come up after 3 retries in iteration {ite}")
-                break
-
-        if link_detected_match and i < len(ipAddresses):
-            log_message(f"Pinging {ipAddresses[i]} from {iface}...")
-            ser.write(f"ping -c 10 {ipAddresses[i]}\n".encode())
-            time.sleep(15)
-
-            ping_output = read_serial_output(ser, 15)
-            log_message(ping_output)
-
-            match = re.search(r"(\d+) packets transmitted, (\d+) received, (\d+)% packet loss", ping_output)
+        link_detected, speed, time_to_link = links[iface]
+        link_status = "Yes" if link_detected else "No"
+        log_message(f"Interface {iface} - Link Detected: {link_status}, Speed: {speed}")
+        if link_detected:
+            log_message(f"Interface {iface} negotiated its link in {time_to_link} seconds")
+            if i < len(ip_addresses):
+                ping_targets[iface] = ip_addresses[i]
+        else:
+            log_message(f"Interface {iface} failed to come up within {linkTimeout} seconds in iteration {ite}")
 
-            if match:
-                _, packets_received, packet_loss = map(int, match.groups())
-                ping_result = "Ping Passed" if packet_loss == 0 else "Ping Failed"
-            else:
-                ping_result = "Ping Failed"
+    # Ping the targets of all link-up interfaces at once
+    ping_stats = {}
+    if ping_targets:
+        log_message(f"Pinging {', '.join(f'{target} from {iface}' for iface, target in ping_targets.items())}...")
+        async with sampling_paused:
+            with step_span(session, "ping", targets=len(ping_targets)):
+                ping_stats = await ping_all(session, ping_targets, pingCount, pingInterval)
 
-            log_message(f"Ping Result for {iface}: {ping_result}")
-        elif link_status == "No":
+    interface_results = {}
+    for iface in interfaces:
+        link_detected, speed, time_to_link = links[iface]
+        stats = ping_stats.get(iface) or {}
+        if iface in ping_targets:
+            ping_result = "Ping Passed" if stats.get("loss") == 0 else "Ping Failed"
+            log_message(f"Ping Result for {iface}: {ping_result} {stats}")
+        elif not link_detected:
             ping_result = "Link Down"
         else:
             ping_result = "Speed Not 1000Mb/s"
 
         # Update interface_results for excel sheet.
-        if iface not in interface_results:
-            interface_results[iface] = {}
-        interface_results[iface]["Ethernet Detected"] = link_status
-        interface_results[iface]["Speed"] = speed
-        interface_results[iface]["Ping Result"] = ping_result
+        interface_results[iface] = {"Ethernet Detected": "Yes" if link_detected else "No", "Speed": speed,
+                                    "Ping Result": ping_result,
+                                    "Time to Link": time_to_link}
+        interface_results[iface].update((name, stats.get(key)) for name, key in ping_columns)
+
+    # Optional throughput test of every link-up interface against its iperf3 peer
+    throughput_peers = dut["throughputPeers"]
+    throughput_tests = {iface: (ip_addresses[i], throughput_peers[i]) for i, iface in enumerate(interfaces)
+                        if links[iface][0] and i < len(ip_addresses) and i < len(throughput_peers)}
+    if throughput_tests:
+        log_message(f"Testing throughput of {', '.join(throughput_tests)} for {throughputDuration} seconds...")
+        async with sampling_paused:
+            with step_span(session, "throughput", interfaces=len(throughput_tests)):
+                throughput = await throughput_all(session, throughput_tests, throughputDuration, throughputUdpBandwidth)
+        for iface, results in throughput.items():
+            interface_results[iface].update((name, results.get(key)) for name, key in throughput_columns)
+    for iface in interfaces:
+        for name, _ in throughput_columns:
+            interface_results[iface].setdefault(name, None)  # link down, no peer, or stage disabled
+
+    # One hardware inventory serves the USB, LTE and GPS checks
+    log_message("Collecting hardware inventory...")
+    with step_span(session, "inventory"):
+        inventory = await collect_inventory(session)
+    hardware_rules = dut["hardwareRules"]
+    hardware_found = {name: match_hardware(inventory, rule) for name, rule in hardware_rules.items()}
+    log_message(f"Hardware found: {hardware_found}")
+
+    def expected_hardware_found(name):
+        return hardware_found.get(name, 0) >= hardware_rules.get(name, {}).get("count", 1)
 
     # Step 7: USB Check
-    log_message("Checking for USB device (/dev/sda)...")
-    ser.write(b"ls /dev/sd*\n")
-    usb_output = read_serial_output(ser, 5)
-    log_message(usb_output)
-    usb_status = "USB Found" if "/dev/sda" in usb_output else "USB Not Found"
+    usb_status = "USB Found" if expected_hardware_found("USB") else "USB Not Found"
     log_message(f"USB Status: {usb_status}")
 
-    # Step 10: Check the interface was created for the modules (for both LTEs)
-    lte_interfaces = ["LTE Interface Not Found", "LTE Interface Not Found"]  # prefill with default values.
-    lte_devices_count = 0  # count the Telit devices.
-    for lte_num in range(2):  # Assuming 2 LTEs, adjust as needed
-        # Step 8: LTE (Long Term Evolution) Check
-        log_message("Checking for LTE")
-        ser.write(b"lsusb\n")
-        lte_output = read_serial_output(ser, 5)
-        log_message(lte_output)
-        lte_status = "LTE Found" if "Telit Wireless Solutions" in lte_output else "LTE Not Found"
-        if "Telit Wireless Solutions" in lte_output:
-            lte_devices_count += 1
-        log_message(f"LTE Status: {lte_status}")
-        log_message(f"Checking LTE interface {lte_num + 1} was created or not")
-        ser.write(b"ip link show\n")
-        interface_output = read_serial_output(ser, 5)
-        log_message(interface_output)
-
-        log_message(f"LTE Interface {lte_num + 1}: {lte_interfaces[lte_num]}")  # display the default value.
-
-    # Step 12: Checking modem status (for both modems)
-    modem_connection_statuses = []
-    for modem_num in range(2):  # Assuming 2 modems, adjust as needed
-        log_message(f"Checking Modem {modem_num + 1} Status...")
-
-        # Determine the correct modem index (always 0 or 1)
-        modem_index = str(modem_num)
-
-        # Attempt to connect the modem with retry
-        connection_status = "Connection Failed"
-        for retry in range(3):
-            ser.write(f"mmcli -m {modem_index}\n".encode())
-            modem_output = read_serial_output(ser, 5)
-
-            connect_command = f"sudo mmcli -m {modem_index} --simple-connect=\"apn=airtelgprs.com\"\n"
-            ser.write(connect_command.encode())
-            modem_status_output = read_serial_output(ser, 5)
-            if "password for ubuntu" in modem_status_output.lower():
-                log_message("Sudo password required, sending password...")
-                ser.write(f"{password}\n".encode())  # Sending the password
-                modem_status_output = read_serial_output(ser, 5)  # Read the output again
-
-            log_message(modem_status_output)
-
-            # Check for successful connection
-            if "successfully connected the modem" in modem_status_output.lower():
-                connection_status = "Connected Successfully"
-                break
-            time.sleep(3)
-
-        log_message(f"Modem {modem_num + 1} Connection Status: {connection_status}")
+    # Step 12: Discover the modems, so absent modules cost no timeouts, and give each the column of the
+    # module it is. Each modem is read once with `mmcli -K` and only read again after --simple-connect
+    # changed its state.
+    log_message("Discovering modems...")
+    with step_span(session, "modem discovery"):
+        modem_list, _ = await session.run("mmcli -L", 10)
+        log_message(modem_list)
+        modems = OutputParsers.parse_mmcli_list(modem_list)
+        modem_snapshots = {}
+        for modem in modems:
+            await modem_snapshot(session, modem_snapshots, modem)
+    column_modems, surplus_modems = assign_modem_columns(modem_snapshots, dut["modemColumns"], dut["modemDevices"])
+    log_message(f"{len(modems)} modem(s) found, by column: {column_modems}")
+    for modem in surplus_modems:
+        log_message(f"Modem {modem} ({modem_snapshots[modem].get('modem.generic.device')}) matches none of the "
+                    f"{dut['modemColumns']} Modem/SIM columns and is not checked", level=logging.WARNING)
+
+    modem_apns = dut["modemApns"]
+    apns = {modem: modem_apns[min(n, len(modem_apns) - 1)] for n, modem in enumerate(column_modems)
+            if modem is not None}
+    connection_statuses = {}
+    if apns:
+        log_message(f"Connecting modems {', '.join(f'{modem} (APN {apn})' for modem, apn in apns.items())}...")
+        with step_span(session, "modem connect", modems=len(apns)):
+            connection_statuses = await connect_modems(session, modem_snapshots, apns)
+
+    # Step 8: LTE (Long Term Evolution) Check, Step 10: the interfaces created for the modules,
+    # Step 11: the SIM of each module and Step 13: its SIM details
+    lte_statuses, modem_connection_statuses, sim_statuses, sim_details = [], [], [], []
+    lte_interfaces = [iface for iface in hardware_rules.get("LTE interface", {}).get("interfaces", [])
+                      if iface in inventory["interfaces"]]
+    for n in range(dut["modemColumns"]):
+        lte_statuses.append("LTE Found" if hardware_found.get("LTE", 0) > n else "LTE Not Found")
+        lte_interface = lte_interfaces[n] if n < len(lte_interfaces) else "LTE Interface Not Found"
+        log_message(f"LTE {n + 1} Status: {lte_statuses[n]}, Interface: {lte_interface}")
+
+        modem = column_modems[n]
+        if modem is None:
+            snapshot, connection_status = {}, "Modem Not Found"
+        else:
+            with step_span(session, "SIM", sim=n + 1):
+                snapshot = await modem_snapshot(session, modem_snapshots, modem)
+            connection_status = connection_statuses[modem]
+        log_message(f"Modem {n + 1} Connection Status: {connection_status}")
         modem_connection_statuses.append(connection_status)
 
-    # Step 11: Identify the USB Ports Mapped for AT Command Communication and Verify the Module Loaded for the SIM (for both SIMs)
-    sim_statuses = []
-    for sim_num in range(2):  # Assuming 2 SIMs, adjust as needed
-        log_message(f"Checking SIM {sim_num + 1} Status...")
-
-        # Send mmcli command (always -m 0 or -m 1)
-        ser.write(f"mmcli -m {sim_num}\n".encode())
-        sim_output = read_serial_output(ser, 5)
-
-        log_message(sim_output)
-
-        # Default values
-        sim_status = "SIM Not Detected"
-        sim_slot = "Unknown"
-
-        # Extract SIM Slot & Status
-        match = re.search(r"slot (\d+):\s*(.+?)\s*\(active\)", sim_output)
-        if match:
-            sim_slot = f"Slot {match.group(1)}"
-            if "none" in match.group(2).lower():
-                sim_status = "SIM Not Detected"
-            else:
-                sim_status = "SIM Active"
-
-        print(f"SIM Slot: {sim_slot}, SIM Status: {sim_status}")
+        sim_slot, sim_status = sim_slot_status(snapshot)
+        log_message(f"SIM {n + 1} Slot: {sim_slot}, SIM Status: {sim_status}")
         sim_statuses.append({"Slot": sim_slot, "Status": sim_status})
 
-    # Step 13: Get the sim details (for both SIMs)
-    sim_details = []
-    for modem_num in range(2):  # Assuming 2 modems, adjust as needed
-        log_message(f"Getting SIM {modem_num + 1} Details...")
-
-        # Determine the correct modem index (always 0 or 1)
-        modem_index = str(modem_num)
-        ser.write(f"mmcli -m {modem_index}\n".encode())
-        modem_output = read_serial_output(ser, 5)
-
-        # Run command to get SIM details
-        get_sim_command = f"sudo mmcli -m {modem_index}\n"
-        ser.write(get_sim_command.encode())
-
-        # Check if sudo password is required
-        sim_details_output = read_serial_output(ser, 5)
-        if "password for ubuntu" in sim_details_output.lower():
-            log_message("Sudo password required, sending password...")
-            ser.write(f"{password}\n".encode())
-            sim_details_output = read_serial_output(ser, 5)
-
-        log_message(sim_details_output)
-
-        # Extract the required details
-        operator_name = f"SIM{modem_num + 1} Operator Name Not Found"
-        registration_status = f"SIM{modem_num + 1} Registration Not Found"
-
-        details = {"Operator Name": operator_name, "Registration": registration_status}
-        if "operator name" in sim_details_output.lower() and "registration" in sim_details_output.lower():
-            try:
-                for line in sim_details_output.split("\n"):
-                    if "operator name" in line:
-                        operator_name = line.split(":")[-1].strip()
-                        details["Operator Name"] = operator_name
-                    elif "registration" in line:
-                        registration_status = line.split(":")[-1].strip()
-                        details["Registration"] = registration_status
-            except Exception as e:
-                log_message(f"Error parsing SIM {modem_num + 1} details: {e}", level=logging.ERROR)
-        else:
-            log_message(f"SIM {modem_num + 1} operator name or registration not found")
-
-        # Log the extracted values
-        log_message(f"SIM {modem_num + 1} Operator Name: {details['Operator Name']}, Registration: {details['Registration']}")
+        details = {"Operator Name": snapshot.get("modem.3gpp.operator-name") or f"SIM{n + 1} Operator Name Not Found",
+                   "Registration": snapshot.get("modem.3gpp.registration-state") or f"SIM{n + 1} Registration Not Found"}
+        log_message(f"SIM {n + 1} Operator Name: {details['Operator Name']}, Registration: {details['Registration']}")
         sim_details.append(details)
 
     # Step GPS Check
-    log_message("Checking GPS Status...")
-    ser.write(b"lsusb\n")
-    gps_output = read_serial_output(ser, 5)
-    gps_status = "GPS Found" if "U-Blox AG u-blox GNSS receiver" in gps_output else "GPS Not Found"
+    gps_status = "GPS Found" if expected_hardware_found("GPS") else "GPS Not Found"
     log_message(f"GPS Status: {gps_status}")
 
+    # Stop the telemetry sampler once it has covered telemetryDuration seconds of stress
+    remaining = telemetryDuration - (time.monotonic() - stress_start) / timeScale
+    if remaining > 0:
+        log_message(f"Sampling telemetry for {remaining:.0f} more seconds of stress-ng...")
+        with step_span(session, "telemetry wait"):
+            await pause(remaining)
+    stop_sampling.set()
+    await sampler
+    log_message(f"{len(samples)} telemetry sample(s) taken during stress-ng")
+
     # Step 14: Store data in Excel
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     row_data = [ite, timestamp, cpu_usage, temperature, memory_usage, power_cycle_status, usb_status, gps_status]
 
     # Add LTE and SIM results to row_data
-    if lte_devices_count == 1 and len(lte_interfaces) == 1:
-        lte1_status = "LTE Found"
-        lte2_status = "LTE Not Found"
-    elif lte_devices_count == 2 and len(lte_interfaces) == 2:
-        lte1_status = "LTE Found"
-        lte2_status = "LTE Found"
-    else:
-        lte1_status = "LTE Not Found"
-        lte2_status = "LTE Not Found"
-
-    row_data.extend([lte1_status, lte2_status, sim_statuses[0]["Status"], sim_statuses[1]["Status"],
-                     modem_connection_statuses[0], modem_connection_statuses[1],
-                     sim_details[0]["Operator Name"], sim_details[1]["Operator Name"],
-                     sim_details[0]["Registration"], sim_details[1]["Registration"]])
+    row_data.extend(lte_statuses)
+    row_data.extend(sim["Status"] for sim in sim_statuses)
+    row_data.extend(modem_connection_statuses)
+    row_data.extend(details["Operator Name"] for details in sim_details)
+    row_data.extend(details["Registration"] for details in sim_details)
 
     # Add interface results to row_data
     for iface in interfaces:
         row_data.extend([interface_results[iface]["Ethernet Detected"],
                          interface_results[iface]["Speed"],
-                         interface_results[iface]["Ping Result"]])
-
-    sensor_headers = list(sensors_data.keys())
-    free_headers = list(free_data.keys())
-    mpstat_headers = list(mpstat_headers)
+                         interface_results[iface]["Ping Result"],
+                         interface_results[iface]["Time to Link"]])
+        row_data.extend(interface_results[iface][name] for name, _ in ping_columns)
+        if dut["throughputPeers"]:
+            row_data.extend(interface_results[iface][name] for name, _ in throughput_columns)
 
-    header_full = header + header_extend + sensor_headers + free_headers + mpstat_headers
-
-    # Update header in excel
-    for col_num, header_item in enumerate(header_full, 1):
-        ws.cell(row=1, column=col_num, value=header_item)
-
-    # After the headers are added, re-apply formatting and column width adjustments.
-    for col_num, header_item in enumerate(header_full, 1):
-        column_letter = get_column_letter(col_num)
-        max_length = len(header_item)
-
-        for row in ws.iter_rows(min_row=2):
-            cell_value = row[col_num - 1].value
-            if cell_value and len(str(cell_value)) > max_length:
-                max_length = len(str(cell_value))
-
-        ws.column_dimensions[column_letter].width = max_length + 5
-
-        cell = ws.cell(row=1, column=col_num)
-        cell.font = header_font
-        cell.alignment = header_alignment
+    row_data.extend(telemetry_summary(samples))
+    row_data.extend(throttle_summary(samples, throttleThreshold, throttleReference))
 
     # Add sensor, free, and mpstat data to row_data
-    for sensor in sensor_headers:
-        row_data.append(sensors_data[sensor])
-    for free in free_headers:
-        row_data.append(free_data[free])
-    for mpstat in mpstat_headers:
-        row_data.append(mpstat_data[mpstat])
+    metric_columns = snapshot_columns(snapshots)
+    header_full = dut_header(dut) + [name for name, _ in metric_columns]
+    row_data.extend(value for _, value in metric_columns)
 
     log_message(f"row_data: {row_data}") # add this line.
-
-    header_full = header + header_extend + sensor_headers + free_headers + mpstat_headers
     log_message(f"header_full: {header_full}") # add this line.
 
-    ws.append(row_data)
-
-    # Apply data alignment for all cells in the row
-    for col_num in range(1, len(row_data) + 1):
-        cell = ws.cell(row=ite + 1, column=col_num)
-        cell.alignment = data_alignment
-        
-    ser.write("rm /mnt/lvm/testfile\n".encode())
-    time.sleep(2)
+    await session.run("rm /mnt/lvm/testfile")
 
-    # ser.write("exit\n".encode())
+    # session.send("exit")
     # time.sleep(1)
-    # ser.write("exit\n".encode())
+    # session.send("exit")
     # time.sleep(1)
-    # ser.write("exit\n".encode())
+    # session.send("exit")
     # time.sleep(1)
     # ser.write(b"\n" * 5)
     # time.sleep(1)
 
-    # Save the Excel file after each iteration
+    return header_full, row_data, samples
+
+async def run_dut(dut):
+    """Runs the iteration loop on one DUT over its own console session."""
+    current_dut.set(dut["id"])
+    session = ConsoleSession(dut["serialDevice"], baudRate)
+    session.connect()
     try:
-        wb.save(excelFile)
-        log_message(f"Results saved to {excelFile} after iteration {ite}")
+        # Run for multiple iterations
+        for ite in range(1, iteration + 1):
+            log_message(f"\n========== Iteration {ite} ==========\n")
+            spans, tasks = [], []
+            current_spans.set(spans)
+            current_tasks.set(tasks)
+            session.text_queries.clear()  # retry the JSON modes, e.g. after a tool update
+            try:
+                results = await run_iteration(dut, session, ite)
+            except Exception as e:
+                # One failed iteration must not cost the DUT the rest of the run: record it and go on
+                log_message(f"Iteration {ite} failed: {e!r}", level=logging.ERROR, exc_info=True)
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                results = (dut_header(dut), [ite, timestamp, None, None, None, f"Iteration Failed ({e!r})"], [])
+            finally:
+                for task in tasks:
+                    task.cancel()
+                write_trace(dut, ite, spans)
+            if results:
+                try:
+                    await store_results(dut, ite, *results)
+                except Exception as e:
+                    log_message(f"Could not store iteration {ite}: {e!r}", level=logging.ERROR, exc_info=True)
+            if not await session.send("", newline=False):
+                log_message(f"Console {dut['serialDevice']} lost, run aborted after iteration {ite}.", level=logging.ERROR)
+                break
     except Exception as e:
-        log_message(f"Error saving Excel file after iteration {ite}: {e}", level=logging.ERROR)
+        log_message(f"Run aborted: {e!r}", level=logging.ERROR, exc_info=True)
+    finally:
+        session.disconnect()
 
-    ser.close()
+async def run_fleet():
+    """Runs every DUT through the iteration loop concurrently on one event loop."""
+    await asyncio.gather(*(run_dut(dut) for dut in duts))
 
-# Save the Excel file
-#wb.save(excelFile)
-#log_message(f"Results saved to {excelFile}")
+asyncio.run(run_fleet())
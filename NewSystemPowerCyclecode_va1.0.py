@@ -8,10 +8,13 @@ import os
 import requests
 from requests.auth import HTTPBasicAuth
 import re
+import select
 import logging
 from datetime import datetime
 import json
+import random
 import subprocess
+import OutputParsers
 
 # Load configuration from JSON file
 jsonFile = "config.json"
@@ -33,7 +36,9 @@ except FileNotFoundError:
         "username": "ubuntu",
         "password": "ubuntu123",
         "ipAddresses": ["192.168.1.11", "192.168.2.12", "192.168.3.13", "192.168.4.14", "192.168.5.15", "192.168.6.16", "192.168.7.17", "192.168.8.18"],
-        "interfaces": ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"]
+        "interfaces": ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"],
+        "promptPatterns": ["root@ubuntu:", "ubuntu@ubuntu:", "Password:", "ubuntu login:"],
+        "maxBootTime": 240
     }
     with open("config.json", "w") as f:
         json.dump(default_config, f, indent=4)
@@ -50,6 +55,8 @@ username = config["username"]
 password = config["password"]
 ipAddresses = config["ipAddresses"]
 interfaces = config["interfaces"]
+promptPatterns = config.get("promptPatterns", ["root@ubuntu:", "ubuntu@ubuntu:", "Password:", "ubuntu login:"])
+maxBootTime = config.get("maxBootTime", 240)
 
 # Set up logging
 logFilename = "consoleLog2.txt"
@@ -70,75 +77,138 @@ def clean_output(output):
     output = re.sub(r'\x1b\[\?2004[hl]', '', output)
     return output.strip()
 
-def read_serial_output(ser, timeout=15, command_sent=None, remove_extra_shell=True):
-    """Reads and cleans serial output."""
-    output = ""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if ser.inWaiting() > 0:
-            output += ser.read(ser.inWaiting()).decode(errors="ignore")
-        time.sleep(0.1)
-    output = clean_output(output)
+def prompt_at_tail(buffer, prompts):
+    """Returns the prompt shown on the last line of the raw serial buffer, or None."""
+    last_line = clean_output(bytes(buffer[buffer.rfind(b"\n") + 1:]).decode(errors="ignore"))
+    for prompt in prompts:
+        if prompt in last_line:
+            return prompt
+    return None
+
+def read_serial_chunk(ser, wait):
+    """Blocks until serial data arrives or wait seconds pass, and returns the bytes read."""
+    try:
+        fd = ser.fileno()
+    except (AttributeError, OSError):
+        # No pollable descriptor (e.g. Windows): block in read() on the port timeout instead
+        data = ser.read(1)
+        return data + ser.read(ser.inWaiting()) if data else data
+    if not select.select([fd], [], [], max(wait, 0))[0]:
+        return b""
+    return ser.read(ser.inWaiting() or 1)
+
+def read_serial_output(ser, timeout=15, command_sent=None, remove_extra_shell=True,
+                       prompts=promptPatterns, idle_timeout=None, prompt_settle=0.2, return_reason=False):
+    """Reads and cleans serial output.
+
+    The read ends as soon as one of the prompts is shown on the last line and the
+    line stays quiet for prompt_settle seconds, or once no data arrived for
+    idle_timeout seconds. timeout is the hard cap. Pass prompts=None to always
+    read for the full timeout. With return_reason the output is returned together
+    with what ended the read: "prompt", "idle" or "timeout".
+    """
+    buffer = bytearray()
+    reason = "timeout"
+    deadline = time.monotonic() + timeout
+    last_data_time = time.monotonic()
+    prompt_seen = False
+    while True:
+        now = time.monotonic()
+        if prompt_seen and now - last_data_time >= prompt_settle:
+            reason = "prompt"
+            break
+        if idle_timeout and now - last_data_time >= idle_timeout:
+            reason = "idle"
+            break
+        if now >= deadline:
+            break
+        wake_up = deadline
+        if prompt_seen:
+            wake_up = min(wake_up, last_data_time + prompt_settle)
+        if idle_timeout:
+            wake_up = min(wake_up, last_data_time + idle_timeout)
+        chunk = read_serial_chunk(ser, wake_up - now)
+        if chunk:
+            buffer += chunk
+            last_data_time = time.monotonic()
+            prompt_seen = bool(prompts) and prompt_at_tail(buffer, prompts) is not None
+    output = clean_output(buffer.decode(errors="ignore"))
 
     if command_sent:
         escaped_command = re.escape(command_sent)
         output = re.sub(rf"^\s*{escaped_command}\s*$", "", output, flags=re.MULTILINE).strip()
+    if return_reason:
+        return output, reason
     return output
 
+def wait_for_boot(ser, max_boot_time, login_prompt="ubuntu login:"):
+    """Streams the console during boot and returns True as soon as the login prompt shows up."""
+    buffer = bytearray()
+    marker = login_prompt.encode()
+    deadline = time.monotonic() + max_boot_time
+    while time.monotonic() < deadline:
+        chunk = read_serial_chunk(ser, deadline - time.monotonic())
+        if chunk:
+            search_from = max(0, len(buffer) - len(marker) + 1)
+            buffer += chunk
+            if buffer.find(marker, search_from) != -1:
+                return True
+    return False
+
 def extract_system_stats(output):
-    """Extracts CPU Usage, Temperature, and Memory Usage from console output."""
-    cpu_usage, temperature, memory_usage = "Not Found", "Not Found", "Not Found"
+    """Extracts CPU Usage (%), Temperature (°C), and Memory Usage (%) from console output, None if not found."""
+    cpu_usage, temperature, memory_usage = None, None, None
     output = output.replace("\r", "").replace("\n", "").replace(" ", " ")
     match = re.search(r"Usage of /:\s+([\d.]+%)", output)
     if match:
-        cpu_usage = match.group(1)
+        cpu_usage, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Temperature:\s+([\d.]+ C)", output)
     if match:
-        temperature = match.group(1)
+        temperature, _ = OutputParsers.parse_quantity(match.group(1))
     match = re.search(r"Memory usage:\s+([\d.]+%)", output)
     if match:
-        memory_usage = match.group(1)
+        memory_usage, _ = OutputParsers.parse_quantity(match.group(1))
     return cpu_usage, temperature, memory_usage
 
 free_headers = [
-    "before stress-ng mem total",
-    "before stress-ng mem used",
-    "before stress-ng mem free",
-    "before stress-ng mem shared",
-    "before stress-ng mem buff/cache",
-    "before stress-ng mem available",
-    "before stress-ng swap total",
-    "before stress-ng swap used",
-    "before stress-ng swap free",
-    "after stress-ng mem total",
-    "after stress-ng mem used",
-    "after stress-ng mem free",
-    "after stress-ng mem shared",
-    "after stress-ng mem buff/cache",
-    "after stress-ng mem available",
-    "after stress-ng swap total",
-    "after stress-ng swap used",
-    "after stress-ng swap free",
+    "before stress-ng mem total (B)",
+    "before stress-ng mem used (B)",
+    "before stress-ng mem free (B)",
+    "before stress-ng mem shared (B)",
+    "before stress-ng mem buff/cache (B)",
+    "before stress-ng mem available (B)",
+    "before stress-ng swap total (B)",
+    "before stress-ng swap used (B)",
+    "before stress-ng swap free (B)",
+    "after stress-ng mem total (B)",
+    "after stress-ng mem used (B)",
+    "after stress-ng mem free (B)",
+    "after stress-ng mem shared (B)",
+    "after stress-ng mem buff/cache (B)",
+    "after stress-ng mem available (B)",
+    "after stress-ng swap total (B)",
+    "after stress-ng swap used (B)",
+    "after stress-ng swap free (B)",
 ]
 
 def parse_free_output_hardcoded(free_output, prefix):
-    """Parses the 'free -h' output with hardcoded logic."""
+    """Parses the 'free -h' output with hardcoded logic, in bytes ("1.2Gi" -> 1288490188.8)."""
     free_data = {}
     lines = free_output.splitlines()
 
     for line in lines:
         parts = line.split()
         if len(parts) >= 7 and parts[0] == "Mem:":
-            free_data[f"{prefix} mem total"] = parts[1]
-            free_data[f"{prefix} mem used"] = parts[2]
-            free_data[f"{prefix} mem free"] = parts[3]
-            free_data[f"{prefix} mem shared"] = parts[4]
-            free_data[f"{prefix} mem buff/cache"] = parts[5]
-            free_data[f"{prefix} mem available"] = parts[6]
+            free_data[f"{prefix} mem total (B)"], _ = OutputParsers.parse_quantity(parts[1])
+            free_data[f"{prefix} mem used (B)"], _ = OutputParsers.parse_quantity(parts[2])
+            free_data[f"{prefix} mem free (B)"], _ = OutputParsers.parse_quantity(parts[3])
+            free_data[f"{prefix} mem shared (B)"], _ = OutputParsers.parse_quantity(parts[4])
+            free_data[f"{prefix} mem buff/cache (B)"], _ = OutputParsers.parse_quantity(parts[5])
+            free_data[f"{prefix} mem available (B)"], _ = OutputParsers.parse_quantity(parts[6])
         elif len(parts) >= 4 and parts[0] == "Swap:":
-            free_data[f"{prefix} swap total"] = parts[1]
-            free_data[f"{prefix} swap used"] = parts[2]
-            free_data[f"{prefix} swap free"] = parts[3]
+            free_data[f"{prefix} swap total (B)"], _ = OutputParsers.parse_quantity(parts[1])
+            free_data[f"{prefix} swap used (B)"], _ = OutputParsers.parse_quantity(parts[2])
+            free_data[f"{prefix} swap free (B)"], _ = OutputParsers.parse_quantity(parts[3])
 
     return free_data
 
@@ -153,7 +223,7 @@ def send_rps_command(command):
         log_message(f"RPS command '{command}' failed. Error: {e}", level=logging.ERROR)
         return False
         
-def get_random_sum_parts(total=180, rebootCount):
+def get_random_sum_parts(total=180, count=10):
     if count > total:
         raise ValueError("Count cannot be greater than the total sum.")
 
@@ -170,12 +240,12 @@ wb = openpyxl.Workbook()
 ws = wb.active
 
 # Start with a minimal header (interfaces will be added later)
-header = ["Iteration", "Timestamp", "CPU Usage", "CPU Temperature", "Memory Usage", "Power Cycle Status", "USB Status", "GPS Status"]
+header = ["Iteration", "Timestamp", "CPU Usage (%)", "CPU Temperature (°C)", "Memory Usage (%)", "Power Cycle Status", "USB Status", "GPS Status"]
 header_extend = ["LTE1 Status", "LTE2 Status", "SIM1 Status", "SIM2 Status", "Modem1 Connection Status",
                  "Modem2 Connection Status", "SIM1 Operator Name", "SIM2 Operator Name", "SIM1 Registration",
                  "SIM2 Registration"]
 for iface in interfaces:
-    header_extend.extend([f"{iface} Ethernet Detected", f"{iface} Speed", f"{iface} Ping Result"])
+    header_extend.extend([f"{iface} Ethernet Detected", f"{iface} Speed (bit/s)", f"{iface} Ping Result"])
 
 sensor_headers = []
 free_headers = []
@@ -230,50 +300,60 @@ for ite in range(1, iteration + 1):
         if not send_rps_command("3 false"):
             power_cycle_status = "Failed"  # Update status if any reboot fails
 
-        time.sleep(result[reboot_num])
+        time.sleep(result[reboot_num - 1])
 
         # Turn ON the port
         log_message(f"Turning ON the port (Reboot {reboot_num})...")
         if not send_rps_command("3 true"):
             power_cycle_status = "Failed"  # Update status if any reboot fails
 
-        time.sleep(on_duration)
+        if reboot_num < rebootCount:
+            time.sleep(on_duration)
 
     log_message("Reboot cycle completed.")
 
-    log_message("Waiting for 240 seconds for device reboot...")
-    time.sleep(240)
-
-    # Establish serial connection
+    # Establish serial connection right away so the whole boot is streamed
     log_message("Re-establishing serial connection...")
-    try:
-        ser = serial.Serial(serialDevice, baudRate, timeout=1)
-        time.sleep(2)
-    except serial.SerialException as e:
-        log_message(f"Error opening serial port: {e}", level=logging.ERROR)
+    boot_start = time.monotonic()
+    ser = None
+    while ser is None:
+        try:
+            ser = serial.Serial(serialDevice, baudRate, timeout=1)
+        except serial.SerialException as e:
+            if time.monotonic() - boot_start >= maxBootTime:
+                log_message(f"Error opening serial port: {e}", level=logging.ERROR)
+                break
+            time.sleep(1)  # USB-serial adapter may still be enumerating
+    if ser is None:
         continue
 
+    log_message(f"Waiting up to {maxBootTime} seconds for device reboot...")
+    if wait_for_boot(ser, maxBootTime - (time.monotonic() - boot_start)):
+        log_message(f"Device booted in {time.monotonic() - boot_start:.1f} seconds.")
+    else:
+        log_message(f"'ubuntu login:' not seen within {maxBootTime} seconds of power on.", level=logging.WARNING)
+
     # Ensure login prompt
     log_message("Checking for 'ubuntu login:' prompt...")
     ser.write(b"\n" * 5)
-    output = read_serial_output(ser, 30, remove_extra_shell=False)
+    output, reason = read_serial_output(ser, 30, remove_extra_shell=False, return_reason=True)
     if "ubuntu login:" not in output:
-        log_message("[ERROR] 'ubuntu login:' not detected, skipping this iteration.", level=logging.ERROR)
+        log_message(f"[ERROR] 'ubuntu login:' not detected (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
         continue
 
     # Enter credentials
     log_message("Logging in...")
     ser.write(f"{username}\n".encode())
-    output = read_serial_output(ser, 10, remove_extra_shell=False)
+    output, reason = read_serial_output(ser, 10, remove_extra_shell=False, return_reason=True)
     if "Password:" not in output:
-        log_message("[ERROR] Password prompt not detected, skipping this iteration.", level=logging.ERROR)
+        log_message(f"[ERROR] Password prompt not detected (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
         continue
     ser.write(f"{password}\n".encode())
-    output = read_serial_output(ser, 10)
+    output, reason = read_serial_output(ser, 10, return_reason=True)
 
     # Check for login prompt
     if "root@ubuntu:" not in output and "ubuntu@ubuntu:" not in output:
-        log_message("[ERROR] Login failed, skipping this iteration.", level=logging.ERROR)
+        log_message(f"[ERROR] Login failed (read ended on {reason}), skipping this iteration.", level=logging.ERROR)
         continue
 
     # Extract system stats
@@ -296,42 +376,13 @@ for ite in range(1, iteration + 1):
 
     # Sensor data collection (before stress-ng)
     log_message("Collecting sensor data (before stress-ng)...")
+    ser.reset_input_buffer()  # drop prompts left by the unread commands above
     ser.write(b"sensors\n")
     sensors_output = read_serial_output(ser, 10)
     log_message(sensors_output)
 
-    lines = sensors_output.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensor_name = parts[0].strip()
-            sensor_value = parts[1].split("(")[0].strip()
-
-            full_sensor_name = sensor_name
-            adapter_info = None
-
-            # Scan backward to find adapter information
-            for j in range(i - 1, -1, -1):
-                if "Adapter:" in lines[j]:
-                    adapter_info = lines[j - 1].strip() + " " + lines[j].split(":")[1].strip()
-                    break
-
-            if adapter_info:
-                full_sensor_name = "before stress-ng " + adapter_info + " " + sensor_name
-            elif "Core" in sensor_name:
-                full_sensor_name = "before stress-ng " + sensor_name
-            else:
-                full_sensor_name = "before stress-ng " + sensor_name
-
-            # Check for existing detailed header before adding simpler one
-            if adapter_info or "Core" in sensor_name:
-                sensors_data[full_sensor_name] = sensor_value
-            elif full_sensor_name not in [key for key in sensors_data.keys() if "Adapter:" in key or "Core" in key]:
-                sensors_data[full_sensor_name] = sensor_value
-
-        i += 1
+    for sensor_name, (value, unit) in OutputParsers.parse_sensors_text(sensors_output).items():
+        sensors_data[OutputParsers.with_unit("before stress-ng " + sensor_name, unit)] = value
 
     # Memory usage details (free -h) (before stress-ng)
     log_message("Collecting memory usage details (free -h) (before stress-ng)...")
@@ -348,22 +399,12 @@ for ite in range(1, iteration + 1):
     mpstat_output = read_serial_output(ser, 10)
     log_message(mpstat_output)
 
-    mpstat_lines = mpstat_output.splitlines()
-    for line in mpstat_lines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":
-                cpu_name = parts[1]
-                mpstat_details = {
-                    f"before stress-ng average CPU {cpu_name} %usr": parts[2],
-                    f"before stress-ng average CPU {cpu_name} %nice": parts[3],
-                    f"before stress-ng average CPU {cpu_name} %sys": parts[4],
-                    f"before stress-ng average CPU {cpu_name} %iowait": parts[5],
-                    f"before stress-ng average CPU {cpu_name} %soft": parts[7],
-                    f"before stress-ng average CPU {cpu_name} %idle": parts[11],
-                }
-                mpstat_data.update(mpstat_details)
-                mpstat_headers.update(mpstat_details)
+    # Average: rows only, so 12-hour (AM/PM) timestamps do not shift the columns
+    for cpu_name, stats in OutputParsers.parse_mpstat_text(mpstat_output).items():
+        mpstat_details = {f"before stress-ng average CPU {cpu_name} %{field}": stats[field]
+                          for field in ("usr", "nice", "sys", "iowait", "soft", "idle")}
+        mpstat_data.update(mpstat_details)
+        mpstat_headers.update(mpstat_details)
 
     # stress-ng commands
     log_message("Starting stress-ng commands...")
@@ -375,42 +416,13 @@ for ite in range(1, iteration + 1):
 
     # Sensor data collection (after stress-ng)
     log_message("Collecting sensor data (after stress-ng)...")
+    ser.reset_input_buffer()  # drop prompts left by the unread commands above
     ser.write(b"sensors\n")
     sensors_output = read_serial_output(ser, 10)
     log_message(sensors_output)
 
-    lines = sensors_output.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if ":" in line and "Adapter:" not in line and "[sudo]" not in line and "root@ubuntu" not in line:
-            parts = line.split(":")
-            sensor_name = parts[0].strip()
-            sensor_value = parts[1].split("(")[0].strip()
-
-            full_sensor_name = sensor_name
-            adapter_info = None
-
-            # Scan backward to find adapter information
-            for j in range(i - 1, -1, -1):
-                if "Adapter:" in lines[j]:
-                    adapter_info = lines[j - 1].strip() + " " + lines[j].split(":")[1].strip()
-                    break
-
-            if adapter_info:
-                full_sensor_name = "after stress-ng " + adapter_info + " " + sensor_name
-            elif "Core" in sensor_name:
-                full_sensor_name = "after stress-ng " + sensor_name
-            else:
-                full_sensor_name = "after stress-ng " + sensor_name
-
-            # Check for existing detailed header before adding simpler one
-            if adapter_info or "Core" in sensor_name:
-                sensors_data[full_sensor_name] = sensor_value
-            elif full_sensor_name not in [key for key in sensors_data.keys() if "Adapter:" in key or "Core" in key]:
-                sensors_data[full_sensor_name] = sensor_value
-
-        i += 1
+    for sensor_name, (value, unit) in OutputParsers.parse_sensors_text(sensors_output).items():
+        sensors_data[OutputParsers.with_unit("after stress-ng " + sensor_name, unit)] = value
 
     # Memory usage details (free -h) (after stress-ng)
     log_message("Collecting memory usage details (free -h) (after stress-ng)...")
@@ -427,22 +439,12 @@ for ite in range(1, iteration + 1):
     mpstat_output = read_serial_output(ser, 10)
     log_message(mpstat_output)
 
-    mpstat_lines = mpstat_output.splitlines()
-    for line in mpstat_lines:
-        if line.startswith("Average:") or line.startswith("1"):
-            parts = line.split()
-            if len(parts) >= 12 and parts[1] != "CPU":
-                cpu_name = parts[1]
-                mpstat_details = {
-                    f"after stress-ng average CPU {cpu_name} %usr": parts[2],
-                    f"after stress-ng average CPU {cpu_name} %nice": parts[3],
-                    f"after stress-ng average CPU {cpu_name} %sys": parts[4],
-                    f"after stress-ng average CPU {cpu_name} %iowait": parts[5],
-                    f"after stress-ng average CPU {cpu_name} %soft": parts[7],
-                    f"after stress-ng average CPU {cpu_name} %idle": parts[11],
-                }
-                mpstat_data.update(mpstat_details)
-                mpstat_headers.update(mpstat_details)
+    # Average: rows only, so 12-hour (AM/PM) timestamps do not shift the columns
+    for cpu_name, stats in OutputParsers.parse_mpstat_text(mpstat_output).items():
+        mpstat_details = {f"after stress-ng average CPU {cpu_name} %{field}": stats[field]
+                          for field in ("usr", "nice", "sys", "iowait", "soft", "idle")}
+        mpstat_data.update(mpstat_details)
+        mpstat_headers.update(mpstat_details)
 
     # Update sensor headers and data
     sensor_headers = list(sensors_data.keys())
@@ -503,7 +505,7 @@ for ite in range(1, iteration + 1):
             speed_match = re.search(r"Speed:\s*(\d+)Mb/s", ethtool_output)
 
             link_status = "Yes" if link_detected_match else "No"
-            speed = speed_match.group(0) if speed_match else "Unknown"
+            speed, _ = OutputParsers.parse_quantity(speed_match.group(0)) if speed_match else (None, None)
 
             log_message(f"Interface {iface} - Link Detected: {link_status}, Speed: {speed}")
 
@@ -0,0 +1,282 @@
+"""Parsers for the console output of the DUT queries, with typed results.
+
+Every query is registered with the command of its machine-readable mode and the
+plain-text command it falls back to when the tools on the DUT are too old for JSON
+output. Both parsers of a query return the same structure.
+"""
+import json
+import re
+from collections import OrderedDict
+
+
+class OutputParser:
+    """A DUT query: its JSON and text commands and the parser of each."""
+
+    def __init__(self, name, json_command, parse_json, text_command, parse_text):
+        self.name = name
+        self.json_command = json_command
+        self.parse_json = parse_json
+        self.text_command = text_command
+        self.parse_text = parse_text
+
+
+# Query name -> OutputParser. Commands are format strings, e.g. "ethtool --json {iface}".
+PARSERS = OrderedDict()
+
+
+def register_parser(name, json_command, parse_json, text_command, parse_text):
+    PARSERS[name] = OutputParser(name, json_command, parse_json, text_command, parse_text)
+
+
+# Unit as printed by the DUT tools -> (SI unit, factor). Temperatures stay in °C and fan speeds in RPM;
+# K/M/G/T sizes are binary, as free -h and lsblk print them.
+UNITS = {
+    "B": ("B", 1), "K": ("B", 2 ** 10), "Ki": ("B", 2 ** 10), "M": ("B", 2 ** 20), "Mi": ("B", 2 ** 20),
+    "G": ("B", 2 ** 30), "Gi": ("B", 2 ** 30), "T": ("B", 2 ** 40), "Ti": ("B", 2 ** 40),
+    "b/s": ("bit/s", 1), "Kb/s": ("bit/s", 1e3), "Mb/s": ("bit/s", 1e6), "Gb/s": ("bit/s", 1e9),
+    "%": ("%", 1), "°C": ("°C", 1), "C": ("°C", 1), "RPM": ("RPM", 1),
+    "V": ("V", 1), "mV": ("V", 1e-3), "A": ("A", 1), "mA": ("A", 1e-3), "W": ("W", 1), "mW": ("W", 1e-3),
+    "J": ("J", 1), "kJ": ("J", 1e3), "s": ("s", 1), "ms": ("s", 1e-3),
+}
+
+
+def parse_quantity(text):
+    """Returns (value in SI units, unit) of a reading, e.g. "1.2Gi" -> (1288490188.8, "B").
+
+    "+45.0°C", "3.4%", "1000Mb/s" and "Speed: 1000Mb/s" work alike; a number without a known
+    unit keeps its unit as printed (or None). (None, None) for text without a number, such
+    as "N/A" or "Not Found".
+    """
+    match = re.search(r"([-+]?\d+(?:\.\d+)?)\s*([^\s(,]*)", text or "")
+    if not match:
+        return None, None
+    unit, factor = UNITS.get(match.group(2), (match.group(2) or None, 1))
+    return float(match.group(1)) * factor, unit
+
+
+def with_unit(name, unit):
+    """Column name with its unit, e.g. "mem total (B)"."""
+    return f"{name} ({unit})" if unit else name
+
+
+# --- ip addr: {ifname: {"flags": [...], "operstate": str, "addresses": [(address, prefixlen), ...]}}
+
+def parse_ip_addr_json(output):
+    interfaces = OrderedDict()
+    for entry in json.loads(output):
+        interfaces[entry["ifname"]] = {
+            "flags": list(entry.get("flags", [])),
+            "operstate": entry.get("operstate", "UNKNOWN"),
+            "addresses": [(info["local"], int(info.get("prefixlen", 32))) for info in entry.get("addr_info", [])
+                          if "local" in info],
+        }
+    return interfaces
+
+
+def parse_ip_addr_text(output):
+    interfaces = OrderedDict()
+    current = None
+    for line in output.splitlines():
+        match = re.match(r"^\d+:\s+([^:@\s]+)(?:@\S+)?:\s+<([^>]*)>", line)
+        if match:
+            state = re.search(r"\bstate (\S+)", line)
+            current = interfaces[match.group(1)] = {"flags": match.group(2).split(",") if match.group(2) else [],
+                                                    "operstate": state.group(1) if state else "UNKNOWN",
+                                                    "addresses": []}
+            continue
+        match = re.match(r"^\s+inet6?\s+([^/\s]+)/(\d+)", line)
+        if match and current is not None:
+            current["addresses"].append((match.group(1), int(match.group(2))))
+    return interfaces
+
+
+register_parser("ip_addr", "ip -j addr", parse_ip_addr_json, "ip addr", parse_ip_addr_text)
+register_parser("ip_link", "ip -j link", parse_ip_addr_json, "ip link", parse_ip_addr_text)
+
+
+# --- lsblk: {name: {"type": "disk"/"part"/..., "size": "28.7G", "tran": "usb" or None}}, partitions included
+
+def parse_lsblk_json(output):
+    devices = OrderedDict()
+    pending = list(json.loads(output)["blockdevices"])
+    while pending:
+        device = pending.pop(0)
+        devices[device["name"]] = {"type": device.get("type"), "size": device.get("size"), "tran": device.get("tran")}
+        pending[:0] = device.get("children", [])
+    return devices
+
+
+def parse_lsblk_text(output):
+    devices = OrderedDict()
+    for line in output.splitlines():
+        fields = {key.lower(): value or None for key, value in re.findall(r'(\w+)="([^"]*)"', line)}
+        if fields.get("name"):
+            devices[fields.pop("name")] = {"type": fields.get("type"), "size": fields.get("size"), "tran": fields.get("tran")}
+    return devices
+
+
+register_parser("lsblk", "lsblk -J -o NAME,TYPE,SIZE,TRAN", parse_lsblk_json, "lsblk -P -o NAME,TYPE,SIZE,TRAN",
+                parse_lsblk_text)
+
+
+# --- ethtool: {"link_detected": bool, "speed": Mb/s or None, "duplex": str or None}
+
+def parse_ethtool_json(output):
+    settings = json.loads(output)[0]
+    speed = settings.get("speed")
+    return {"link_detected": bool(settings.get("link-detected")),
+            "speed": int(speed) if isinstance(speed, int) and speed > 0 else None,
+            "duplex": settings.get("duplex") if settings.get("duplex") in ("Full", "Half") else None}
+
+
+def parse_ethtool_text(output):
+    speed = re.search(r"Speed:\s*(\d+)Mb/s", output)
+    duplex = re.search(r"Duplex:\s*(Full|Half)", output)
+    return {"link_detected": re.search(r"Link detected: yes", output) is not None,
+            "speed": int(speed.group(1)) if speed else None,
+            "duplex": duplex.group(1) if duplex else None}
+
+
+register_parser("ethtool", "ethtool --json {iface}", parse_ethtool_json, "ethtool {iface}", parse_ethtool_text)
+
+
+# --- sensors: {"<chip> <adapter> <label>": (reading, unit)} with readings as floats in °C, RPM, V, A, W, ...
+
+# sensors -j subfeature prefix -> unit; the JSON values are already in these units
+SENSOR_UNITS = {"temp": "°C", "fan": "RPM", "in": "V", "curr": "A", "power": "W", "energy": "J", "humidity": "%"}
+
+
+def parse_sensors_json(output):
+    readings = OrderedDict()
+    for chip, features in json.loads(output).items():
+        adapter = features.get("Adapter", "")
+        for label, values in features.items():
+            if not isinstance(values, dict):
+                continue
+            key, value = next(((key, v) for key, v in values.items() if key.endswith("_input")), (None, None))
+            unit = SENSOR_UNITS.get(re.match(r"[a-z]*", key).group(0)) if key else None
+            readings[f"{chip} {adapter} {label}"] = (float(value) if value is not None else None, unit)
+    return readings
+
+
+def parse_sensors_records(output):
+    """Yields a (chip, adapter, label, value, unit) record per reading of the text output, in one pass.
+
+    The chip is the line before "Adapter:"; readings before any adapter line have chip and
+    adapter None. value and unit come from parse_quantity ("+45.0°C" -> 45.0 and "°C",
+    "+850 mV" -> 0.85 and "V", "N/A" -> None and None).
+    """
+    chip = adapter = None
+    previous = ""
+    for line in output.splitlines():
+        if line.startswith("Adapter:"):
+            chip, adapter = previous, line[len("Adapter:"):].strip()
+            continue
+        label, separator, reading = line.partition(":")
+        if separator and "[sudo]" not in line and "root@ubuntu" not in line:
+            yield (chip, adapter, label.strip()) + parse_quantity(reading.split("(")[0])
+        previous = line.strip()
+
+
+def parse_sensors_text(output):
+    readings = OrderedDict()
+    for chip, adapter, label, value, unit in parse_sensors_records(output):
+        readings[f"{chip} {adapter} {label}" if adapter is not None else label] = (value, unit)
+    return readings
+
+
+register_parser("sensors", "sensors -j", parse_sensors_json, "sensors", parse_sensors_text)
+
+
+# --- mpstat: {cpu: {"usr": %, "nice": %, "sys": %, "iowait": %, "irq": %, "soft": %, "steal": %,
+#                   "guest": %, "gnice": %, "idle": %}} averaged over the run
+
+MPSTAT_FIELDS = ["usr", "nice", "sys", "iowait", "irq", "soft", "steal", "guest", "gnice", "idle"]
+
+
+def parse_mpstat_json(output):
+    statistics = json.loads(output)["sysstat"]["hosts"][0]["statistics"]
+    cpus = OrderedDict()
+    for sample in statistics:
+        for load in sample["cpu-load"]:
+            cpus.setdefault(str(load["cpu"]), []).append([float(load[field]) for field in MPSTAT_FIELDS])
+    return OrderedDict((cpu, dict(zip(MPSTAT_FIELDS, (sum(column) / len(column) for column in zip(*rows)))))
+                       for cpu, rows in cpus.items())
+
+
+def parse_mpstat_text(output):
+    # Only the "Average:" rows: the interval rows start with a timestamp that takes one or two
+    # columns (AM/PM) depending on the locale. Values go by the header names; unparsable ones are None.
+    cpus = OrderedDict()
+    columns = None
+    for line in output.splitlines():
+        parts = line.split()
+        if not parts or parts[0] != "Average:":
+            continue
+        if "CPU" in parts:
+            columns = [name.lstrip("%") for name in parts[parts.index("CPU") + 1:]]
+        elif columns and len(parts) >= 2:
+            values = dict(zip(columns, parts[2:]))
+            cpus[parts[1]] = {field: _float(values.get(field)) for field in MPSTAT_FIELDS}
+    return cpus
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+register_parser("mpstat", "mpstat -o JSON -P ALL 1 1", parse_mpstat_json, "mpstat -P ALL 1 1", parse_mpstat_text)
+
+
+# --- lsusb (text only): [{"bus": int, "device": int, "id": "vendor:product", "description": str}, ...]
+
+def parse_lsusb(output):
+    return [{"bus": int(match.group(1)), "device": int(match.group(2)), "id": match.group(3).lower(),
+             "description": match.group(4).strip()}
+            for match in re.finditer(r"^Bus (\d+) Device (\d+): ID ([0-9a-fA-F]{4}:[0-9a-fA-F]{4})(.*)$", output,
+                                     flags=re.MULTILINE)]
+
+
+# --- iperf3 -J (JSON only, not a registered query): TCP {"mbps": Mbit/s received, "retransmits": int},
+#     UDP {"udp_mbps": Mbit/s, "jitter": ms, "udp_loss": %}, or {"error": message}
+
+def parse_iperf_json(output):
+    result = json.loads(output)
+    if result.get("error"):
+        return {"error": result["error"]}
+    end = result["end"]
+    if result["start"]["test_start"]["protocol"] == "TCP":
+        return {"mbps": round(end["sum_received"]["bits_per_second"] / 1e6, 2),
+                "retransmits": int(end["sum_sent"].get("retransmits", 0))}
+    return {"udp_mbps": round(end["sum"]["bits_per_second"] / 1e6, 2), "jitter": float(end["sum"]["jitter_ms"]),
+            "udp_loss": float(end["sum"]["lost_percent"])}
+
+
+# --- mmcli -L (text only): ModemManager indices of the modems found, e.g. [0, 1]
+
+def parse_mmcli_list(output):
+    return sorted(int(index) for index in re.findall(r"/org/freedesktop/ModemManager1/Modem/(\d+)", output))
+
+
+# --- mmcli -K (key-value only, not a registered query): {"modem.3gpp.operator-name": "airtel", ...}
+#     with "--" as None and "<key>.length"/"<key>.value[N]" arrays as lists under "<key>"
+
+def parse_mmcli_keyvalue(output):
+    properties = {}
+    for line in output.splitlines():
+        key, separator, value = line.partition(":")
+        key, value = key.strip(), value.strip()
+        if not separator or not key.startswith(("modem.", "sim.", "bearer.")):
+            continue
+        value = None if value == "--" else value
+        array = re.match(r"^(.*)\.value\[(\d+)\]$", key)
+        if array:
+            properties.setdefault(array.group(1), []).append(value)
+        elif key.endswith(".length"):
+            properties.setdefault(key[:-len(".length")], [])
+        else:
+            properties[key] = value
+    return properties
@@ -0,0 +1,110 @@
+"""Microbenchmark of the OutputParsers parsers, JSON and text mode side by side.
+
+Every registered query is parsed from canned output of a board with --cpus cores and
+the eight test interfaces, and both modes are checked to give the same keys:
+
+    python ParserBenchmark.py --cpus 64 --number 2000
+"""
+import argparse
+import json
+import timeit
+
+import OutputParsers
+
+INTERFACES = ["eno1", "enp13s0", "enp14s0", "enp15s0", "enp16s0f0", "enp16s0f1", "enp16s0f2", "enp16s0f3"]
+
+
+def sensors_samples(cpus):
+    chips = {"coretemp-isa-0000": {"Adapter": "ISA adapter",
+                                   "Package id 0": {"temp1_input": 46.0, "temp1_max": 80.0, "temp1_crit": 100.0}}}
+    for core in range(cpus):
+        chips["coretemp-isa-0000"][f"Core {core}"] = {f"temp{core + 2}_input": 45.0 + core % 7,
+                                                      f"temp{core + 2}_max": 80.0, f"temp{core + 2}_crit": 100.0}
+    chips["acpitz-acpi-0"] = {"Adapter": "ACPI interface", "temp1": {"temp1_input": 27.8, "temp1_crit": 105.0}}
+    lines = []
+    for chip, features in chips.items():
+        lines += [chip, f"Adapter: {features['Adapter']}"]
+        for label, values in features.items():
+            if label != "Adapter":
+                value = next(value for key, value in values.items() if key.endswith("_input"))
+                lines.append(f"{label + ':':<14}{value:+.1f}°C  (high = +80.0°C, crit = +100.0°C)")
+        lines.append("")
+    return json.dumps(chips, indent=3), "\n".join(lines)
+
+
+def mpstat_samples(cpus):
+    loads = [dict(zip(["cpu"] + OutputParsers.MPSTAT_FIELDS, [cpu, 1.5, 0.0, 0.5, 0.0, 0.0, 0.25, 0.0, 0.0, 0.0, 97.75]))
+             for cpu in ["all"] + [str(n) for n in range(cpus)]]
+    as_json = json.dumps({"sysstat": {"hosts": [{"nodename": "ubuntu", "statistics": [
+        {"timestamp": "10:00:01", "cpu-load": loads}]}]}})
+    header = "CPU    %usr   %nice    %sys %iowait    %irq   %soft  %steal  %guest  %gnice   %idle"
+    rows = [f"{load['cpu']:>5} " + " ".join(f"{load[field]:7.2f}" for field in OutputParsers.MPSTAT_FIELDS)
+            for load in loads]
+    text = "\n".join([f"Linux 5.15.0-105-generic (ubuntu) \t10/18/26 \t_x86_64_\t({cpus} CPU)", "",
+                      f"10:00:01 {header}"] + [f"10:00:01 {row}" for row in rows] + ["", f"Average: {header}"] +
+                     [f"Average: {row}" for row in rows])
+    return as_json, text
+
+
+def ip_addr_samples():
+    table = []
+    for index, iface in enumerate(INTERFACES, 2):
+        table.append({"ifindex": index, "ifname": iface, "flags": ["BROADCAST", "MULTICAST", "UP", "LOWER_UP"],
+                      "mtu": 1500, "operstate": "UP", "link_type": "ether", "address": f"00:11:22:33:44:{index:02x}",
+                      "addr_info": [{"family": "inet", "local": f"192.168.{index - 1}.1{index - 1}", "prefixlen": 24}]})
+    lines = []
+    for entry in table:
+        lines.append(f"{entry['ifindex']}: {entry['ifname']}: <{','.join(entry['flags'])}> mtu 1500 qdisc mq "
+                     f"state {entry['operstate']} group default qlen 1000")
+        lines.append(f"    link/ether {entry['address']} brd ff:ff:ff:ff:ff:ff")
+        for info in entry["addr_info"]:
+            lines.append(f"    inet {info['local']}/{info['prefixlen']} brd 192.168.255.255 scope global {entry['ifname']}")
+    return json.dumps(table), "\n".join(lines)
+
+
+def ethtool_samples():
+    as_json = json.dumps([{"ifname": "eno1", "supported-ports": ["TP"], "auto-negotiation": True, "speed": 1000,
+                           "duplex": "Full", "port": "Twisted Pair", "link-detected": True}])
+    text = ("Settings for eno1:\n\tSupported ports: [ TP ]\n\tAuto-negotiation: on\n\tSpeed: 1000Mb/s\n"
+            "\tDuplex: Full\n\tPort: Twisted Pair\n\tLink detected: yes")
+    return as_json, text
+
+
+def lsblk_samples():
+    disks = [{"name": "sda", "type": "disk", "size": "28.7G", "tran": "usb",
+              "children": [{"name": "sda1", "type": "part", "size": "28.7G", "tran": None}]},
+             {"name": "mmcblk0", "type": "disk", "size": "58.2G", "tran": None,
+              "children": [{"name": f"mmcblk0p{n}", "type": "part", "size": "19.4G", "tran": None} for n in (1, 2, 3)]}]
+    lines = []
+    pending = list(disks)
+    while pending:
+        disk = pending.pop(0)
+        lines.append(f'NAME="{disk["name"]}" TYPE="{disk["type"]}" SIZE="{disk["size"]}" TRAN="{disk["tran"] or ""}"')
+        pending[:0] = disk.get("children", [])
+    return json.dumps({"blockdevices": disks}), "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cpus", type=int, default=16, help="cores in the sensors and mpstat samples")
+    parser.add_argument("--number", type=int, default=1000, help="parses per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs; the fastest is reported")
+    args = parser.parse_args()
+
+    samples = {"sensors": sensors_samples(args.cpus), "mpstat": mpstat_samples(args.cpus),
+               "ip_addr": ip_addr_samples(), "ip_link": ip_addr_samples(), "ethtool": ethtool_samples(),
+               "lsblk": lsblk_samples()}
+    print(f"{'query':<10}{'mode':<6}{'bytes':>8}{'us/parse':>12}")
+    for name, entry in OutputParsers.PARSERS.items():
+        json_output, text_output = samples[name]
+        results = []
+        for mode, parse, output in (("json", entry.parse_json, json_output), ("text", entry.parse_text, text_output)):
+            best = min(timeit.repeat(lambda: parse(output), number=args.number, repeat=args.repeat))
+            print(f"{name:<10}{mode:<6}{len(output.encode()):>8}{best / args.number * 1e6:>12.1f}")
+            results.append(parse(output))
+        if list(results[0]) != list(results[1]):
+            print(f"{name}: JSON and text parsers disagree: {list(results[0])} != {list(results[1])}")
+
+
+if __name__ == "__main__":
+    main()